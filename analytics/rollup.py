@@ -0,0 +1,115 @@
+"""
+Итоги по месяцам и категориям (таблица monthly_category_totals).
+
+Таблица обновляется в той же транзакции, что и сами операции:
+- загрузка выписки прибавляет итоги каждой записанной пачки;
+- удаление выписки вычитает итоги её операций;
+- ручная смена категории вычитает строку до изменения и прибавляет после;
+- массовая смена категории пересчитывает затронутые месяцы целиком.
+
+Полная перестройка для починки:
+
+    python -m analytics.rollup [--user email]
+"""
+import argparse
+
+from sqlalchemy import case, delete, func, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+
+from database import engine, MonthlyCategoryTotal, Transaction as DBTransaction
+
+TX_MONTH = func.strftime("%Y-%m", DBTransaction.op_date)
+
+
+def _aggregate(condition):
+    cost = DBTransaction.cost
+    return (
+        select(
+            DBTransaction.user_email,
+            TX_MONTH,
+            DBTransaction.category,
+            func.sum(case((cost < 0, -cost), else_=0.0)),
+            func.sum(case((cost > 0, cost), else_=0.0)),
+            func.count(),
+        )
+        .where(condition & DBTransaction.op_date.is_not(None))
+        .group_by(DBTransaction.user_email, TX_MONTH, DBTransaction.category)
+    )
+
+
+def add_to_rollup(session: Session, condition, sign: int = 1):
+    """Прибавляет (sign=1) или вычитает (sign=-1) итоги операций, подходящих под condition."""
+    rows = [{
+        "user_email": user_email, "month": month, "category": category,
+        "spend": sign * spend, "income": sign * income, "count": sign * count,
+    } for user_email, month, category, spend, income, count in session.exec(_aggregate(condition)).all()]
+    if not rows:
+        return
+
+    table = MonthlyCategoryTotal.__table__
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_email", "month", "category"],
+        set_={
+            "spend": table.c.spend + stmt.excluded.spend,
+            "income": table.c.income + stmt.excluded.income,
+            "count": table.c.count + stmt.excluded.count,
+        }
+    )
+    session.connection().execute(stmt, rows)
+    if sign < 0:
+        session.exec(delete(MonthlyCategoryTotal).where(
+            MonthlyCategoryTotal.user_email.in_({row["user_email"] for row in rows}) &
+            (MonthlyCategoryTotal.count <= 0)
+        ))
+
+
+def affected_months(session: Session, condition) -> set[tuple[str, str]]:
+    """Пары (user_email, месяц), в которых есть операции под condition."""
+    return set(session.exec(
+        select(DBTransaction.user_email, TX_MONTH)
+        .where(condition & DBTransaction.op_date.is_not(None))
+        .distinct()
+    ).all())
+
+
+def refresh_months(session: Session, months: set[tuple[str, str]]):
+    """Пересчитывает итоги заданных месяцев с нуля по самим операциям."""
+    if not months:
+        return
+    months = list(months)
+    session.exec(delete(MonthlyCategoryTotal).where(
+        tuple_(MonthlyCategoryTotal.user_email, MonthlyCategoryTotal.month).in_(months)
+    ))
+    add_to_rollup(
+        session,
+        DBTransaction.user_email.in_({user_email for user_email, _ in months}) &
+        tuple_(DBTransaction.user_email, TX_MONTH).in_(months)
+    )
+
+
+def rebuild_rollup(session: Session, user_email: str | None = None):
+    """Полная перестройка таблицы (или только строк одного пользователя)."""
+    if user_email is None:
+        session.exec(delete(MonthlyCategoryTotal))
+        add_to_rollup(session, DBTransaction.id.is_not(None))
+    else:
+        session.exec(delete(MonthlyCategoryTotal).where(MonthlyCategoryTotal.user_email == user_email))
+        add_to_rollup(session, DBTransaction.user_email == user_email)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перестроить monthly_category_totals по таблице операций")
+    parser.add_argument("--user", help="только этот пользователь (email)")
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        rebuild_rollup(session, args.user)
+        session.commit()
+        rows = session.exec(select(func.count()).select_from(MonthlyCategoryTotal)).one()
+    print(f"monthly_category_totals: {rows} строк")
+
+
+if __name__ == "__main__":
+    main()
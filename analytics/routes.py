@@ -1,18 +1,55 @@
-from fastapi import APIRouter, Header, HTTPException
-from sqlmodel import Session, select
-from database import engine, Transaction as DBTransaction
+from fastapi import APIRouter, Header, HTTPException, Request, Response
+from sqlmodel import Session
+from database import engine
 from jose import jwt
 from datetime import datetime, timedelta, date
 from collections import defaultdict
 from dateutil.relativedelta import relativedelta
+from fastapi import Depends
 from analytics.utils import generate_category_stats, generate_monthly_stats, generate_income_stats, generate_monthly_advice
+from auth.utils import get_current_user
+from cache import cached, result_cache
 
 router = APIRouter()
 
 SECRET, ALGO = "supersecretkey", "HS256"
 
+
+# Ответы эндпоинтов через кэш; их же собирает /dashboard, так что записи кэша общие
+def category_analytics(session: Session, user_email: str, request: Request | None = None, response: Response | None = None):
+    return cached(
+        session, user_email, "analytics/categories", {"day": datetime.utcnow().date()},
+        lambda: generate_category_stats(session, user_email),
+        request, response
+    )
+
+
+def monthly_analytics(session: Session, user_email: str, request: Request | None = None, response: Response | None = None):
+    return cached(
+        session, user_email, "analytics/monthly", {"month": datetime.utcnow().strftime("%Y-%m")},
+        lambda: generate_monthly_stats(session, user_email),
+        request, response
+    )
+
+
+def income_analytics(session: Session, user_email: str, request: Request | None = None, response: Response | None = None):
+    return cached(
+        session, user_email, "analytics/income", {"month": datetime.utcnow().strftime("%Y-%m")},
+        lambda: generate_income_stats(session, user_email),
+        request, response
+    )
+
+
+def advice_analytics(session: Session, user_email: str, request: Request | None = None, response: Response | None = None):
+    return cached(
+        session, user_email, "advice/monthly", {"month": date.today().strftime("%Y-%m")},
+        lambda: generate_monthly_advice(session, user_email),
+        request, response
+    )
+
+
 @router.get("/analytics/categories")
-def get_category_analytics(authorization: str = Header(...)):
+def get_category_analytics(request: Request, response: Response, authorization: str = Header(...)):
     token = authorization.split(" ")[1]
     try:
         payload = jwt.decode(token, SECRET, algorithms=[ALGO])
@@ -21,15 +58,11 @@ def get_category_analytics(authorization: str = Header(...)):
         raise HTTPException(401, "Invalid or expired token")
 
     with Session(engine) as session:
-        transactions = session.exec(
-            select(DBTransaction).where(DBTransaction.user_email == user_email)
-        ).all()
-
-    return generate_category_stats(transactions)
+        return category_analytics(session, user_email, request, response)
 
 
 @router.get("/analytics/monthly")
-def get_monthly_analytics(authorization: str = Header(...)):
+def get_monthly_analytics(request: Request, response: Response, authorization: str = Header(...)):
     token = authorization.split(" ")[1]
     try:
         payload = jwt.decode(token, SECRET, algorithms=[ALGO])
@@ -38,15 +71,11 @@ def get_monthly_analytics(authorization: str = Header(...)):
         raise HTTPException(401, "Invalid or expired token")
 
     with Session(engine) as session:
-        transactions = session.exec(
-            select(DBTransaction).where(DBTransaction.user_email == user_email)
-        ).all()
-
-    return generate_monthly_stats(transactions)
+        return monthly_analytics(session, user_email, request, response)
 
 
 @router.get("/analytics/income")
-def get_monthly_income(authorization: str = Header(...)):
+def get_monthly_income(request: Request, response: Response, authorization: str = Header(...)):
     token = authorization.split(" ")[1]
     try:
         payload = jwt.decode(token, SECRET, algorithms=[ALGO])
@@ -55,15 +84,11 @@ def get_monthly_income(authorization: str = Header(...)):
         raise HTTPException(401, "Invalid or expired token")
 
     with Session(engine) as session:
-        transactions = session.exec(
-            select(DBTransaction).where(DBTransaction.user_email == user_email)
-        ).all()
-
-    return generate_income_stats(transactions)
+        return income_analytics(session, user_email, request, response)
 
 
 @router.get("/advice/monthly")
-def monthly_advice(authorization: str = Header(...)):
+def monthly_advice(request: Request, response: Response, authorization: str = Header(...)):
     token = authorization.split(" ")[1]
     try:
         payload = jwt.decode(token, SECRET, algorithms=[ALGO])
@@ -72,8 +97,9 @@ def monthly_advice(authorization: str = Header(...)):
         raise HTTPException(401, "Invalid or expired token")
 
     with Session(engine) as session:
-        transactions = session.exec(
-            select(DBTransaction).where(DBTransaction.user_email == user_email)
-        ).all()
+        return advice_analytics(session, user_email, request, response)
+
 
-    return generate_monthly_advice(transactions)
+@router.get("/analytics/cache")
+def get_cache_stats(user: dict = Depends(get_current_user)):
+    return result_cache.stats()
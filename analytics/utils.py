@@ -1,8 +1,14 @@
-from datetime import datetime, timedelta, date
+import math
+from datetime import datetime, timedelta, date, time
 from collections import defaultdict
 from dateutil.relativedelta import relativedelta
 from jose import jwt
 from fastapi import HTTPException
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from analytics.rollup import TX_MONTH
+from database import MonthlyCategoryTotal, Transaction as DBTransaction
 
 SECRET = "supersecretkey"
 ALGO = "HS256"
@@ -20,198 +26,182 @@ def decode_token_and_get_email(authorization: str) -> str:
     except Exception:
         raise HTTPException(401, "Invalid or expired token")
 
-def generate_category_stats(transactions):
-    expenses = defaultdict(float)
-    total_spent = 0.0
-    dates = []
-
-    now = datetime.utcnow()
-    cutoff = now - timedelta(days=30)
-
-    for tx in transactions:
-        try:
-            tx_date = datetime.strptime(tx.date, "%d.%m.%Y")
-        except ValueError:
-            continue
-
-        if tx_date < cutoff or tx.category == "Пополнение" or tx.cost > 0:
-            continue
-
-        expenses[tx.category] += abs(tx.cost)
-        total_spent += abs(tx.cost)
-        dates.append(tx_date)
+def category_cutoff(now: datetime) -> datetime:
+    return now - timedelta(days=30)
 
+def six_month_window(now: datetime) -> tuple[datetime, datetime]:
+    """С первого дня месяца пять месяцев назад по последний день текущего."""
+    six_months_ago = now - relativedelta(months=5)
+    start_cutoff = datetime(six_months_ago.year, six_months_ago.month, 1)
+    end_cutoff = datetime(now.year, now.month, 28) + relativedelta(day=31)
+    return start_cutoff, end_cutoff
+
+def first_day_from(moment: datetime) -> date:
+    """Первый день, полночь которого не раньше moment: так раньше сравнивались даты операций с отсечкой."""
+    day = moment.date()
+    return day if moment.time() == time.min else day + timedelta(days=1)
+
+def last_months(now: datetime, count: int = 6) -> list[str]:
+    return [(now - relativedelta(months=i)).strftime("%Y-%m") for i in reversed(range(count))]
+
+# Суммы из monthly_category_totals копятся прибавлением и вычитанием — меньше копейки считаем нулём
+MIN_AMOUNT = 0.005
+
+def _in_window(user_email: str, start: date, end: date | None = None):
+    condition = (DBTransaction.user_email == user_email) & (DBTransaction.op_date >= start)
+    if end is not None:
+        condition &= DBTransaction.op_date <= end
+    return condition
+
+def _is_expense():
+    return (DBTransaction.cost <= 0) & (DBTransaction.category != "Пополнение")
+
+def generate_category_stats(session: Session, user_email: str, now: datetime | None = None):
+    """Расходы по категориям за последние 30 дней — один GROUP BY по индексу (user_email, op_date)."""
+    now = now or datetime.utcnow()
+    rows = session.exec(
+        select(
+            DBTransaction.category,
+            func.sum(func.abs(DBTransaction.cost)),
+            func.min(DBTransaction.op_date),
+            func.max(DBTransaction.op_date),
+        )
+        .where(_in_window(user_email, first_day_from(category_cutoff(now))) & _is_expense())
+        .group_by(DBTransaction.category)
+        .order_by(func.min(DBTransaction.id))
+    ).all()
+
+    starts = [row[2] for row in rows]
+    ends = [row[3] for row in rows]
     period = {
-        "start": min(dates).strftime("%d.%m.%Y") if dates else None,
-        "end": max(dates).strftime("%d.%m.%Y") if dates else None
+        "start": min(starts).strftime("%d.%m.%Y") if rows else None,
+        "end": max(ends).strftime("%d.%m.%Y") if rows else None
     }
 
-    categories_list = [
-        {"category": name, "amount": round(amount, 2)}
-        for name, amount in expenses.items()
-    ]
-
     return {
-        "totalSpent": round(total_spent, 2),
+        "totalSpent": round(sum(row[1] for row in rows), 2),
         "period": period,
-        "categories": categories_list
+        "categories": [
+            {"category": category, "amount": round(amount, 2)}
+            for category, amount, _, _ in rows
+        ]
     }
 
-def generate_monthly_stats(transactions):
-    now = datetime.utcnow()
-    six_months_ago = now - relativedelta(months=5)
-    start_cutoff = datetime(six_months_ago.year, six_months_ago.month, 1)
-    end_cutoff = datetime(now.year, now.month, 28) + relativedelta(day=31)
-
-    monthly_data = defaultdict(lambda: defaultdict(list))
-
-    for tx in transactions:
-        try:
-            tx_date = datetime.strptime(tx.date, "%d.%m.%Y")
-        except:
-            continue
-
-        if tx_date < start_cutoff or tx_date > end_cutoff:
-            continue
-        if tx.cost > 0 or tx.category == "Пополнение":
-            continue
-
-        month_key = tx_date.strftime("%Y-%m")
-        monthly_data[month_key][tx.category].append({
-            "amount": abs(tx.cost),
-            "description": tx.description
-        })
-
-    month_keys_ordered = [
-        (now - relativedelta(months=i)).strftime("%Y-%m")
-        for i in reversed(range(6))
-    ]
+def generate_monthly_stats(session: Session, user_email: str, now: datetime | None = None):
+    """
+    Расходы по месяцам и категориям за полгода. Суммы берутся из monthly_category_totals;
+    «Другие» по-прежнему отдаются построчно, с описанием каждой операции.
+    Внутри месяца категории идут, как и раньше, в порядке первой операции каждой из них.
+    """
+    now = now or datetime.utcnow()
+    months = last_months(now)
+    totals = session.exec(
+        select(MonthlyCategoryTotal.month, MonthlyCategoryTotal.category, MonthlyCategoryTotal.spend)
+        .where(
+            (MonthlyCategoryTotal.user_email == user_email) &
+            MonthlyCategoryTotal.month.in_(months) &
+            (MonthlyCategoryTotal.category != "Пополнение") &
+            (MonthlyCategoryTotal.spend >= MIN_AMOUNT)
+        )
+        .order_by(MonthlyCategoryTotal.month)
+    ).all()
+
+    start_cutoff, end_cutoff = six_month_window(now)
+    window = _in_window(user_email, start_cutoff.date(), end_cutoff.date()) & _is_expense()
+    # Порядка операций в итогах нет: первую операцию категории в месяце берём по индексу (user_email, op_date)
+    first_ids = {(month_key, cat): first_id for month_key, cat, first_id in session.exec(
+        select(TX_MONTH, DBTransaction.category, func.min(DBTransaction.id))
+        .where(window)
+        .group_by(TX_MONTH, DBTransaction.category)
+    ).all()}
+    totals = sorted(totals, key=lambda row: (row[0], first_ids.get((row[0], row[1]), math.inf)))
+
+    others = session.exec(
+        select(TX_MONTH, func.abs(DBTransaction.cost), DBTransaction.description)
+        .where(window & (DBTransaction.category == "Другие"))
+        .order_by(DBTransaction.id)
+    ).all()
+    other_rows = defaultdict(list)
+    for month_key, amount, description in others:
+        other_rows[month_key].append({"amount": round(amount, 2), "description": description})
 
     result = []
-    for month_key in month_keys_ordered:
-        if month_key not in monthly_data:
-            continue
-
-        year, month = map(int, month_key.split("-"))
-        month_label = MONTHS_RU[month]
-
-        for cat, tx_list in monthly_data[month_key].items():
-            if cat == "Другие":
-                for tx in tx_list:
-                    result.append({
-                        "month": month_label,
-                        "category": cat,
-                        "amount": round(tx["amount"], 2),
-                        "description": tx["description"]
-                    })
-            else:
-                total = sum(tx["amount"] for tx in tx_list)
-                result.append({
-                    "month": month_label,
-                    "category": cat,
-                    "amount": round(total, 2)
-                })
+    for month_key, cat, total in totals:
+        month_label = MONTHS_RU[int(month_key[5:])]
+        if cat == "Другие":
+            result.extend({"month": month_label, "category": cat, **row} for row in other_rows[month_key])
+        else:
+            result.append({"month": month_label, "category": cat, "amount": round(total, 2)})
 
     return result
 
-
-
-def generate_income_stats(transactions):
-    now = datetime.utcnow()
-    six_months_ago = now - relativedelta(months=5)
-    start_cutoff = datetime(six_months_ago.year, six_months_ago.month, 1)
-    end_cutoff = datetime(now.year, now.month, 28) + relativedelta(day=31)
-
-    monthly_data = defaultdict(lambda: defaultdict(list))
-
-    for tx in transactions:
-        try:
-            tx_date = datetime.strptime(tx.date, "%d.%m.%Y")
-        except:
-            continue
-
-        if tx_date < start_cutoff or tx_date > end_cutoff:
-            continue
-        if tx.cost <= 0 or tx.category != "Пополнение":
-            continue
-
-        month_key = tx_date.strftime("%Y-%m")
-        monthly_data[month_key][tx.category].append({
-            "amount": round(tx.cost, 2),
-            "description": tx.description
+def generate_income_stats(session: Session, user_email: str, now: datetime | None = None):
+    """Пополнения за полгода построчно: из БД читаются только месяц, сумма и описание."""
+    now = now or datetime.utcnow()
+    start_cutoff, end_cutoff = six_month_window(now)
+    rows = session.exec(
+        select(TX_MONTH, DBTransaction.cost, DBTransaction.description)
+        .where(
+            _in_window(user_email, start_cutoff.date(), end_cutoff.date()) &
+            (DBTransaction.cost > 0) &
+            (DBTransaction.category == "Пополнение")
+        )
+        .order_by(DBTransaction.id)
+    ).all()
+
+    monthly_data = defaultdict(list)
+    for month_key, cost, description in rows:
+        monthly_data[month_key].append({
+            "month": MONTHS_RU[int(month_key[5:])],
+            "category": "Пополнение",
+            "amount": round(cost, 2),
+            "description": description
         })
 
-    month_keys_ordered = [
-        (now - relativedelta(months=i)).strftime("%Y-%m")
-        for i in reversed(range(6))
-    ]
-
     result = []
-    for month_key in month_keys_ordered:
-        if month_key not in monthly_data:
-            continue
-
-        year, month = map(int, month_key.split("-"))
-        month_label = MONTHS_RU[month]
-
-        for cat, tx_list in monthly_data[month_key].items():
-            for tx in tx_list:
-                result.append({
-                    "month": month_label,
-                    "category": cat,
-                    "amount": tx["amount"],
-                    "description": tx["description"]
-                })
-
+    for month_key in last_months(now):
+        result.extend(monthly_data.get(month_key, []))
     return result
 
 
 import random
 
-def generate_monthly_advice(transactions):
-    today = date.today()
-
-    first_this_month = today.replace(day=1)
-    last_this_month = (first_this_month + relativedelta(months=1)) - timedelta(days=1)
-
-    first_last_month = first_this_month - relativedelta(months=1)
-    last_last_month = first_this_month - timedelta(days=1)
+EMOJI_BY_CATEGORY = {
+    "Кофейни": "☕️",
+    "Магазины": "🛍️",
+    "ЖКХ": "💡",
+    "Развлечения": "🎬",
+    "Доставка": "🍔",
+    "Транспорт": "🚌",
+    "Другие": "📊"
+}
 
-    EMOJI_BY_CATEGORY = {
-        "Кофейни": "☕️",
-        "Магазины": "🛍️",
-        "ЖКХ": "💡",
-        "Развлечения": "🎬",
-        "Доставка": "🍔",
-        "Транспорт": "🚌",
-        "Другие": "📊"
-    }
+def generate_monthly_advice(session: Session, user_email: str, today: date | None = None):
+    """Советы по сравнению трат этого и прошлого месяца — две выборки из monthly_category_totals."""
+    today = today or date.today()
+    this_month = today.strftime("%Y-%m")
+    last_month = (today.replace(day=1) - relativedelta(months=1)).strftime("%Y-%m")
+
+    rows = session.exec(
+        select(
+            MonthlyCategoryTotal.month,
+            MonthlyCategoryTotal.category,
+            MonthlyCategoryTotal.spend + MonthlyCategoryTotal.income,
+        )
+        .where(
+            (MonthlyCategoryTotal.user_email == user_email) &
+            MonthlyCategoryTotal.month.in_([this_month, last_month])
+        )
+    ).all()
 
     sums = {'this': defaultdict(float), 'last': defaultdict(float)}
-    total_this = 0
-
-    for tx in transactions:
-        try:
-            tx_date = datetime.strptime(tx.date, "%d.%m.%Y").date()
-        except ValueError:
-            continue
-
-        period = None
-        if first_this_month <= tx_date <= last_this_month:
-            period = 'this'
-        elif first_last_month <= tx_date <= last_last_month:
-            period = 'last'
-
-        if not period:
-            continue
-
-        category = tx.category or "Другие"
-        amount = abs(tx.cost)
+    for month_key, cat, amount in rows:
+        sums['this' if month_key == this_month else 'last'][cat or "Другие"] += amount
+    total_this = sum(sums['this'].values())
 
-        sums[period][category] += amount
-        if period == 'this':
-            total_this += amount
+    return advice_from_sums(sums, total_this)
 
+def advice_from_sums(sums: dict, total_this: float) -> list[dict]:
     advice_list = []
     for cat in set(sums['this']) | set(sums['last']):
         if cat in {"Переводы", "Пополнение"}:
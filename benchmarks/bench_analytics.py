@@ -0,0 +1,91 @@
+"""
+Задержка аналитики в зависимости от длины истории пользователя.
+Последние полгода у всех пользователей одинаковые, меняется только объём старых операций.
+
+    python -m benchmarks.bench_analytics [--history 1000 10000 100000] [--recent 1000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+CATEGORIES = ["Кофейни", "Магазины", "Доставка", "ЖКХ", "Другие", "Пополнение", "Переводы"]
+
+
+def make_rows(user_email: str, count: int, start_days: int, end_days: int, rnd: random.Random) -> list[dict]:
+    rows = []
+    for i in range(count):
+        op_date = date.today() - timedelta(days=rnd.randint(start_days, end_days))
+        category = rnd.choice(CATEGORIES)
+        cost = round(rnd.uniform(100, 5000), 2)
+        rows.append({
+            "date": op_date.strftime("%d.%m.%Y"),
+            "op_date": op_date,
+            "time": None,
+            "cost": cost if category == "Пополнение" else -cost,
+            "description": f"Оплата {i % 50}",
+            "category": category,
+            "bank": "tbank",
+            "user_email": user_email,
+        })
+    return rows
+
+
+def timed(fn, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--history", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--recent", type=int, default=1_000, help="операций за последние полгода")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # database.py открывает ./transactions.db — работаем во временном каталоге
+    os.chdir(tempfile.mkdtemp())
+    from sqlmodel import Session, select
+    from database import engine, init_db, Transaction as DBTransaction
+    from migrations import run_migrations
+    from analytics.utils import (
+        generate_category_stats, generate_monthly_stats, generate_income_stats, generate_monthly_advice
+    )
+
+    init_db()
+    run_migrations()
+    rnd = random.Random(1)
+    with Session(engine) as session:
+        for history in args.history:
+            user_email = f"user{history}@bench"
+            rows = make_rows(user_email, args.recent, 0, 150, rnd)
+            rows += make_rows(user_email, max(history - args.recent, 0), 200, 3650, rnd)
+            session.connection().execute(DBTransaction.__table__.insert(), rows)
+        session.commit()
+
+    endpoints = {
+        "categories": generate_category_stats,
+        "monthly": generate_monthly_stats,
+        "income": generate_income_stats,
+        "advice": generate_monthly_advice,
+    }
+    print(f"{'history':>8}  {'load all (было)':>15}  " + "  ".join(f"{name:>10}" for name in endpoints))
+    for history in args.history:
+        user_email = f"user{history}@bench"
+        with Session(engine) as session:
+            load_all = timed(lambda: session.exec(
+                select(DBTransaction).where(DBTransaction.user_email == user_email)
+            ).all(), args.repeat)
+            times = [timed(lambda: fn(session, user_email), args.repeat) for fn in endpoints.values()]
+        print(f"{history:>8}  {load_all * 1000:>13.1f}ms  " + "  ".join(f"{t * 1000:>8.1f}ms" for t in times))
+
+
+if __name__ == "__main__":
+    main()
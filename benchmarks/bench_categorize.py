@@ -0,0 +1,62 @@
+"""
+Скорость категоризации Т-Банка: прежний перебор шаблонов против Categorizer.
+
+    python -m benchmarks.bench_categorize [--rows 100000] [--repeat 3]
+"""
+import argparse
+import random
+import re
+import time
+
+from transactions.utils import TBANK_CATEGORIES, categorize_tbank
+
+WORDS = [
+    "Оплата в", "Перевод", "Пополнение", "Ивану И.", "Омск", "RUS", "Moscow", "ООО", "ИП", "1234",
+    "PYATEROCHKA", "Пятёрочка", "Coffeemania", "YANDEX", "EDA", "METRO", "GLOBUS", "МАРИЯ-РА",
+    "OZON", "ZHKU", "Kinopoisk", "ivi", "SBP", "магазин", "Ромашка", "Transport", "sport",
+]
+
+
+def legacy_tbank(txs):
+    """categorize_tbank до переделки: компиляция на каждый вызов и any() по категориям."""
+    regex = {cat: [re.compile(p, re.IGNORECASE) for p in pats] for cat, pats in TBANK_CATEGORIES.items()}
+    for tx in txs:
+        tx['category'] = 'Другие'
+        for cat, patterns in regex.items():
+            if any(p.search(tx['description']) for p in patterns):
+                tx['category'] = cat
+                break
+    return txs
+
+
+def make_descriptions(rows: int, seed: int = 1) -> list[str]:
+    rnd = random.Random(seed)
+    return [" ".join(rnd.choice(WORDS) for _ in range(rnd.randint(3, 8))) for _ in range(rows)]
+
+
+def timed(fn, descriptions, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        txs = [{"description": d} for d in descriptions]
+        t = time.perf_counter()
+        result = fn(txs)
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    return best, [tx['category'] for tx in result]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    descriptions = make_descriptions(args.rows)
+    old_time, old = timed(legacy_tbank, descriptions, args.repeat)
+    new_time, new = timed(categorize_tbank, descriptions, args.repeat)
+    assert old == new, "результаты категоризации разошлись"
+    print(f"rows={args.rows}  legacy={old_time:.3f}s  categorizer={new_time:.3f}s  x{old_time / new_time:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Скорость извлечения текста из PDF в зависимости от числа процессов.
+
+    python -m benchmarks.bench_extract statement.pdf [--workers 1 2 4 8] [--repeat 3]
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from transactions.utils import extract_page_range, split_page_ranges, open_pdf
+
+
+def extract_parallel(pool: ProcessPoolExecutor, data: bytes, page_count: int, workers: int, chunk: int) -> list[str]:
+    ranges = split_page_ranges(0, page_count, max(chunk, -(-page_count // workers)))
+    futures = [pool.submit(extract_page_range, data, a, b) for a, b in ranges]
+    pages = []
+    for f in futures:
+        pages.extend(f.result())
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pdf")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()])
+    parser.add_argument("--chunk", type=int, default=1, help="минимум страниц в куске")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(args.pdf, "rb") as f:
+        data = f.read()
+    with open_pdf(data) as pdf:
+        page_count = len(pdf.pages)
+
+    reference = extract_page_range(data, 0, page_count)
+    print(f"{args.pdf}: {page_count} страниц")
+    print(f"{'workers':>8} {'сек':>8} {'стр/сек':>9} {'ускорение':>10}")
+
+    baseline = None
+    for workers in sorted(set(args.workers)):
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            # Прогрев: запуск процессов и импорт pdfplumber не входят в замер
+            list(pool.map(extract_page_range, [data] * workers, [0] * workers, [1] * workers))
+
+            best = float("inf")
+            for _ in range(args.repeat):
+                t = time.perf_counter()
+                pages = extract_parallel(pool, data, page_count, workers, args.chunk)
+                best = min(best, time.perf_counter() - t)
+
+        assert pages == reference, "параллельное извлечение разошлось с последовательным"
+        baseline = baseline or best
+        print(f"{workers:>8} {best:>8.2f} {page_count / best:>9.1f} {baseline / best:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
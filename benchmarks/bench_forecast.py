@@ -0,0 +1,116 @@
+"""
+Прогноз по категориям: прежний цикл с LinearRegression на каждую категорию
+против forecast.engine (одна матрица месяц × категория, МНК в замкнутом виде):
+без кэша и с попаданием в кэш прогнозов по отпечатку ряда.
+
+    python -m benchmarks.bench_forecast [--categories 5 20 100] [--rows-per-category 200] [--repeat 5]
+"""
+import argparse
+import math
+import random
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+
+from cache import MemoryBackend
+from forecast import utils as forecast_utils
+from forecast.routes import ForecastRequest, forecast_categories
+
+MONTH = "2025-01"
+
+
+def legacy_forecast_categories(month: str, req: ForecastRequest) -> list[tuple[str, float]]:
+    """forecast_categories до переделки, без HTTP-обёртки."""
+    target_date = pd.to_datetime(month + "-01", format="%Y-%m-%d")
+    df = pd.DataFrame([t.model_dump() for t in req.transactions])
+    df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    df = df.dropna(subset=['date'])
+    df = df[~df['is_income']]
+    df = df[df['cost'] < 0]
+    df = df[~df['category'].isin(["Переводы", "Пополнения", "Пополнение"])]
+    start_date = target_date - pd.DateOffset(months=12)
+    df = df[(df['date'] >= start_date) & (df['date'] < target_date)]
+    df['year_month'] = df['date'].dt.to_period('M').astype(str)
+    monthly_cat = df.groupby(['year_month', 'category'])['cost'].sum().reset_index()
+
+    results = []
+    for cat in monthly_cat['category'].unique():
+        cat_data = monthly_cat[monthly_cat['category'] == cat].copy()
+        cat_data = cat_data.sort_values('year_month')
+        cat_data['month_index'] = range(len(cat_data))
+        if len(cat_data) < 3:
+            continue
+        model = LinearRegression()
+        model.fit(cat_data[['month_index']], cat_data['cost'])
+        results.append([cat, model.predict(pd.DataFrame({'month_index': [len(cat_data)]}))[0]])
+
+    total_cat_forecast = sum(amount for _, amount in results)
+    monthly_total = df.groupby('year_month')['cost'].sum().reset_index().sort_values('year_month')
+    monthly_total['month_index'] = range(len(monthly_total))
+    model_total = LinearRegression()
+    model_total.fit(monthly_total[['month_index']], monthly_total['cost'])
+    overall_prediction = model_total.predict(pd.DataFrame({'month_index': [len(monthly_total)]}))[0]
+    scale_factor = overall_prediction / total_cat_forecast if total_cat_forecast != 0 else 1.0
+    results = [(cat, round(amount * scale_factor, 2)) for cat, amount in results]
+    return sorted(results, key=lambda x: abs(x[1]), reverse=True)[:3]
+
+
+def make_request(categories: int, rows_per_category: int, rnd: random.Random) -> ForecastRequest:
+    transactions = []
+    end = date(2024, 12, 31)
+    for c in range(categories):
+        # У части категорий расходы не каждый месяц, у некоторых — меньше трёх месяцев
+        months = rnd.sample(range(12), rnd.choice([2, 6, 9, 12]))
+        base, trend = rnd.uniform(500, 20000), rnd.uniform(-300, 300)
+        for _ in range(rows_per_category):
+            month = rnd.choice(months)
+            day = end - timedelta(days=30 * month + rnd.randint(0, 27))
+            transactions.append({
+                "date": day.isoformat(),
+                "cost": -round(max(base + trend * (12 - month), 10) * rnd.uniform(0.5, 1.5) / 10, 2),
+                "is_income": False,
+                "category": f"Категория {c}",
+            })
+    return ForecastRequest(transactions=transactions)
+
+
+def timed(fn, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--categories", type=int, nargs="+", default=[5, 20, 100])
+    parser.add_argument("--rows-per-category", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    def cold(req):
+        forecast_utils.forecast_cache.backend = MemoryBackend(1, math.inf)
+        return forecast_categories(MONTH, req)
+
+    print(f"{'categories':>10}  {'sklearn loop':>12}  {'engine':>8}  {'memo hit':>8}")
+    for categories in args.categories:
+        req = make_request(categories, args.rows_per_category, rnd)
+        old = legacy_forecast_categories(MONTH, req)
+        new = forecast_categories(MONTH, req)["categories"]
+        assert [cat for cat, _ in old] == [item["category"] for item in new], "категории прогноза разошлись"
+        assert all(abs(a - item["amount"]) <= 0.011 for (_, a), item in zip(old, new)), "прогнозы разошлись"
+
+        old_time = timed(lambda: legacy_forecast_categories(MONTH, req), args.repeat)
+        new_time = timed(lambda: cold(req), args.repeat)
+        hit_time = timed(lambda: forecast_categories(MONTH, req), args.repeat)
+        print(f"{categories:>10}  {old_time * 1000:>10.1f}ms  {new_time * 1000:>6.1f}ms  {hit_time * 1000:>6.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
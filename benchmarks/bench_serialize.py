@@ -0,0 +1,93 @@
+"""
+Стоимость ответа /transactions/history без учёта HTTP: прежний путь через TransactionOut
+и response_model против dict-строк из кортежей столбцов и orjson.
+
+    python -m benchmarks.bench_serialize [--rows 1000 10000 100000] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+from typing import List
+
+from benchmarks.bench_analytics import make_rows, timed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # database.py открывает ./transactions.db — работаем во временном каталоге
+    os.chdir(tempfile.mkdtemp())
+    from fastapi.responses import ORJSONResponse
+    from pydantic import TypeAdapter
+    from sqlmodel import Session, select
+    from database import engine, init_db, Transaction as DBTransaction
+    from migrations import run_migrations
+    from transactions.routes import TransactionOut, HISTORY_COLUMNS, parse_date
+
+    init_db()
+    run_migrations()
+    rnd = random.Random(1)
+    with Session(engine) as session:
+        for rows in args.rows:
+            session.connection().execute(DBTransaction.__table__.insert(), make_rows(f"user{rows}@bench", rows, 0, 3650, rnd))
+        session.commit()
+
+    # То же, что делает FastAPI с response_model: проверка, сериализация в JSON-типы и json.dumps
+    adapter = TypeAdapter(List[TransactionOut])
+
+    def legacy(session, user_email):
+        transactions = session.exec(
+            select(DBTransaction)
+            .where(DBTransaction.user_email == user_email)
+            .order_by(DBTransaction.op_date.desc(), DBTransaction.id.desc())
+        ).all()
+        content = [
+            TransactionOut(
+                id=tx.id,
+                date=tx.op_date or parse_date(tx.date),
+                amount=tx.cost,
+                description=tx.description,
+                category=tx.category,
+                bank=tx.bank,
+                isIncome=tx.cost > 0
+            )
+            for tx in transactions
+        ]
+        value = adapter.validate_python(content, from_attributes=True)
+        return json.dumps(
+            adapter.dump_python(value, mode="json"), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+
+    def fast(session, user_email):
+        rows = session.exec(
+            select(*HISTORY_COLUMNS)
+            .where(DBTransaction.user_email == user_email)
+            .order_by(DBTransaction.op_date.desc(), DBTransaction.id.desc())
+        ).all()
+        return ORJSONResponse([{
+            "id": tx_id,
+            "date": op_date or parse_date(raw_date),
+            "amount": cost,
+            "description": description,
+            "category": category,
+            "bank": bank,
+            "isIncome": cost > 0
+        } for tx_id, op_date, raw_date, cost, description, category, bank in rows]).body
+
+    print(f"{'rows':>8}  {'response_model':>14}  {'orjson':>10}")
+    for rows in args.rows:
+        user_email = f"user{rows}@bench"
+        with Session(engine) as session:
+            assert json.loads(legacy(session, user_email)) == json.loads(fast(session, user_email))
+            old = timed(lambda: legacy(session, user_email), args.repeat)
+            new = timed(lambda: fast(session, user_email), args.repeat)
+        print(f"{rows:>8}  {old * 1000:>12.1f}ms  {new * 1000:>8.1f}ms  x{old / new:.1f}")
+
+
+if __name__ == "__main__":
+    main()
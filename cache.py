@@ -0,0 +1,214 @@
+"""
+Кэш вычисленных ответов по ключу (пользователь, эндпоинт, параметры, версия данных).
+
+Версия данных пользователя (User.data_version) растёт при загрузке выписки и смене категорий,
+поэтому старые записи просто перестают запрашиваться и вытесняются по LRU или TTL.
+
+Та же версия даёт слабый ETag ответа: если If-None-Match совпал, отвечаем 304,
+не трогая таблицу операций и не сериализуя тело.
+
+Хранилище подключаемое:
+- memory — OrderedDict в процессе, у каждого воркера uvicorn свой;
+- sqlite — локальный файл CACHE_PATH, общий для всех воркеров на машине.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import Request, Response
+from sqlmodel import Session
+
+from config import CACHE_BACKEND, CACHE_PATH, CACHE_MAX_ENTRIES, CACHE_TTL
+from database import get_data_version
+
+MISSING = object()
+
+
+class MemoryBackend:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        """Возвращает (значение | MISSING, вытеснено_по_ttl)."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return MISSING, 0
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return MISSING, 1
+            self._data.move_to_end(key)
+            return value, 0
+
+    def set(self, key: str, value) -> int:
+        """Сохраняет значение, возвращает число вытесненных по LRU записей."""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            evicted = 0
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def size(self) -> int:
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """
+    Кэш в локальном SQLite-файле: его видят все воркеры на машине.
+    Значения хранятся в JSON, LRU — по времени последнего обращения.
+    """
+
+    def __init__(self, path: str, max_entries: int, ttl: float):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_accessed ON cache (accessed)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return MISSING, 0
+        value, expires = row
+        if expires < now:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            return MISSING, 1
+        conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(value), 0
+
+    def set(self, key: str, value) -> int:
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), now + self.ttl, now)
+        )
+        excess = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_entries
+        if excess <= 0:
+            return 0
+        return conn.execute(
+            "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed LIMIT ?)", (excess,)
+        ).rowcount
+
+    def size(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+BACKENDS = {
+    "memory": lambda: MemoryBackend(CACHE_MAX_ENTRIES, CACHE_TTL),
+    "sqlite": lambda: SQLiteBackend(CACHE_PATH, CACHE_MAX_ENTRIES, CACHE_TTL),
+}
+
+
+class ResultCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(user_email: str, endpoint: str, params: dict, version: int) -> str:
+        return "|".join([user_email, endpoint, json.dumps(params, sort_keys=True, default=str), str(version)])
+
+    def get_or_compute(self, key: str, compute):
+        value, expired = self.backend.get(key)
+        self.expirations += expired
+        if value is not MISSING:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = compute()
+        self.evictions += self.backend.set(key, value)
+        return value
+
+    def stats(self) -> dict:
+        """Счётчики — по текущему процессу, размер — по всему хранилищу."""
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "size": self.backend.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+result_cache = ResultCache(BACKENDS[CACHE_BACKEND]())
+
+
+def etag_for(key: str) -> str:
+    # В ключе есть email: после смены аккаунта на том же устройстве чужой ETag не совпадёт
+    return 'W/"' + hashlib.sha1(key.encode()).hexdigest()[:16] + '"'
+
+
+def etag_matches(if_none_match: str | None, tag: str) -> bool:
+    """Слабое сравнение по RFC 9110: префикс W/ не учитывается."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == tag.removeprefix("W/")
+        for candidate in if_none_match.split(",")
+    )
+
+
+def _conditional(request: Request | None, response: Response | None, key: str) -> Response | None:
+    if response is None:
+        return None
+    tag = etag_for(key)
+    response.headers["ETag"] = tag
+    if request is not None and etag_matches(request.headers.get("if-none-match"), tag):
+        return Response(status_code=304, headers={"ETag": tag})
+    return None
+
+
+def not_modified(request: Request, response: Response, session: Session, user_email: str,
+                 endpoint: str, params: dict | None = None) -> Response | None:
+    """Ставит ETag ответа; если у клиента уже эта версия — возвращает готовый 304."""
+    version = get_data_version(session, user_email)
+    return _conditional(request, response, ResultCache.make_key(user_email, endpoint, params or {}, version))
+
+
+def cached(session: Session, user_email: str, endpoint: str, params: dict, compute,
+           request: Request | None = None, response: Response | None = None):
+    """
+    Ответ эндпоинта из кэша; ключ включает текущую версию данных пользователя.
+    С request/response ещё и ставит ETag и отвечает 304, если у клиента эта версия.
+    """
+    version = get_data_version(session, user_email)
+    key = ResultCache.make_key(user_email, endpoint, params, version)
+    unchanged = _conditional(request, response, key)
+    if unchanged is not None:
+        return unchanged
+    return result_cache.get_or_compute(key, compute)
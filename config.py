@@ -1,7 +1,50 @@
 # config.py
 
+import os
 from datetime import timedelta
 
 SECRET = "supersecretkey"
 ALGO = "HS256"
 ACCESS_TTL = timedelta(days=30)
+
+# --- Разбор PDF-выписок в пуле процессов
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "2"))              # процессов в пуле
+PARSE_MAX_CONCURRENT = int(os.getenv("PARSE_MAX_CONCURRENT", str(PARSE_WORKERS)))  # разборов одновременно
+PARSE_MAX_QUEUE = int(os.getenv("PARSE_MAX_QUEUE", "8"))          # сколько загрузок может ждать своей очереди
+PARSE_RETRY_AFTER = int(os.getenv("PARSE_RETRY_AFTER", "5"))      # секунд, значение заголовка Retry-After для 503
+PARSE_PREWARM = os.getenv("PARSE_PREWARM", "1") == "1"            # поднимать процессы с pdfplumber при старте
+PARSE_CHUNK_PAGES = int(os.getenv("PARSE_CHUNK_PAGES", "10"))      # страниц в куске при параллельном извлечении
+INGEST_BATCH_ROWS = int(os.getenv("INGEST_BATCH_ROWS", "500"))     # операций в одной пачке записи в БД
+
+# --- Фоновые задачи загрузки выписок
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))  # секунд между проверками прогресса в SSE
+JOB_STALE_AFTER = int(os.getenv("JOB_STALE_AFTER", "600"))        # секунд без обновлений — задачу можно перезапустить
+
+# --- Приём файлов
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))  # максимальный размер PDF
+UPLOAD_CHUNK_BYTES = 256 * 1024                                                # читаем загрузку кусками
+PARSE_WORKER_MAX_MEMORY_MB = int(os.getenv("PARSE_WORKER_MAX_MEMORY_MB", "0"))  # лимит памяти процесса разбора, 0 — без лимита
+PARSE_TRACE_MEMORY = os.getenv("PARSE_TRACE_MEMORY", "0") == "1"               # замерять пиковую память разбора (tracemalloc)
+
+# --- Пользовательские правила категорий
+CATEGORY_RULES_CACHE_USERS = int(os.getenv("CATEGORY_RULES_CACHE_USERS", "256"))  # сколько пользователей держать в LRU
+
+# --- Кэш результатов аналитики
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")          # memory — свой у каждого воркера, sqlite — общий файл
+CACHE_PATH = os.getenv("CACHE_PATH", "./cache.db")            # файл кэша для backend=sqlite
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "5000"))  # записей в кэше, лишние вытесняются по LRU
+CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))               # секунд жизни записи
+
+# --- Постраничная выдача операций
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", "200"))  # операций на странице при листании курсором без limit
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "1000"))         # наибольший допустимый limit
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "1000"))  # строк за одну выборку курсора при выгрузке
+
+# --- Сериализация ответов
+FAST_JSON = os.getenv("FAST_JSON", "1") == "1"  # большие списки — готовыми dict через orjson, минуя response_model
+
+# --- Прогноз
+FORECAST_CACHE_SIZE = int(os.getenv("FORECAST_CACHE_SIZE", "1024"))  # прогнозов в LRU по отпечатку помесячного ряда
+
+# --- Портрет
+PORTRAIT_RANGE_MAX_MONTHS = int(os.getenv("PORTRAIT_RANGE_MAX_MONTHS", "24"))  # месяцев в одном запросе /portrait/range
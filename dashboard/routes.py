@@ -0,0 +1,51 @@
+from datetime import date, datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlmodel import Session
+
+from database import engine
+from auth.utils import get_current_user
+from analytics.routes import category_analytics, monthly_analytics, income_analytics, advice_analytics
+from portrait.routes import cached_portrait
+from cache import not_modified
+
+router = APIRouter()
+
+# Разделы дашборда: каждый совпадает с ответом своего отдельного эндпоинта
+SECTIONS = {
+    "categories": lambda session, user_email, month, year: category_analytics(session, user_email),
+    "monthly": lambda session, user_email, month, year: monthly_analytics(session, user_email),
+    "income": lambda session, user_email, month, year: income_analytics(session, user_email),
+    "advice": lambda session, user_email, month, year: advice_analytics(session, user_email),
+    "portrait": cached_portrait,
+}
+
+
+@router.get("/dashboard")
+def get_dashboard(
+    request: Request,
+    response: Response,
+    sections: str = Query(None, description="Разделы через запятую: " + ",".join(SECTIONS)),
+    month: int = Query(None, ge=1, le=12),
+    year: int = Query(None, ge=2000, le=2100),
+    user: dict = Depends(get_current_user)
+):
+    """Все экраны главной одним запросом: одна авторизация, одна сессия, общий кэш с отдельными эндпоинтами."""
+    names = list(SECTIONS) if sections is None else [name.strip() for name in sections.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SECTIONS]
+    if unknown:
+        raise HTTPException(400, f"Неизвестные разделы: {', '.join(unknown)}")
+
+    if month is None or year is None:
+        today = date.today()
+        month = today.month
+        year = today.year
+
+    names = list(dict.fromkeys(names))
+    # Разделы зависят от текущего дня (окно категорий) и месяца, поэтому они тоже в ETag
+    params = {"sections": names, "month": month, "year": year, "day": datetime.utcnow().date(), "today": date.today()}
+    with Session(engine) as session:
+        unchanged = not_modified(request, response, session, user["email"], "dashboard", params)
+        if unchanged is not None:
+            return unchanged
+        return {name: SECTIONS[name](session, user["email"], month, year) for name in names}
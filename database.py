@@ -1,16 +1,24 @@
-from sqlmodel import SQLModel, Field, create_engine, Session
+from sqlmodel import SQLModel, Field, create_engine, Session, select
+from sqlalchemy import Column, LargeBinary, Index, update
 from typing import Optional
 from datetime import datetime, date
 from uuid import uuid4, UUID
 
 class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    email: str
+    email: str = Field(index=True)
     hashed_password: str
+    data_version: int = 0  # растёт при каждом изменении операций пользователя; часть ключа кэша
 
 class Transaction(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_transaction_user_merchant", "user_email", "merchant"),
+        Index("ix_transaction_user_op_date", "user_email", "op_date"),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
-    date: str
+    date: str  # как в выписке: dd.mm.yyyy у Т-Банка, yyyy-mm-dd у Сбера
+    op_date: Optional[date] = None  # та же дата, нормализованная; по ней фильтры и сортировка
     time: str | None
     cost: float
     description: str
@@ -18,15 +26,65 @@ class Transaction(SQLModel, table=True):
     bank: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
     user_email: str
-    statement_id: Optional[int] = Field(default=None, foreign_key="statement.id")
+    statement_id: Optional[int] = Field(default=None, foreign_key="statement.id", index=True)
+    fingerprint: Optional[str] = Field(default=None, index=True, unique=True)
+    merchant: Optional[str] = None  # нормализованное описание, ключ пользовательских правил категорий
+
+class CategoryRule(SQLModel, table=True):
+    """Правило «продавец -> категория», выученное из ручных исправлений пользователя."""
+    __table_args__ = (
+        Index("ix_categoryrule_user_merchant", "user_email", "merchant", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_email: str
+    merchant: str
+    category: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class MonthlyCategoryTotal(SQLModel, table=True):
+    """Итоги по месяцу и категории, обновляются вместе с операциями (analytics/rollup.py)."""
+    __tablename__ = "monthly_category_totals"
+
+    user_email: str = Field(primary_key=True)
+    month: str = Field(primary_key=True)  # YYYY-MM
+    category: str = Field(primary_key=True)
+    spend: float = 0.0   # сумма модулей расходов (cost < 0)
+    income: float = 0.0  # сумма поступлений (cost > 0)
+    count: int = 0
 
 class Statement(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_statement_user_content_hash", "user_email", "content_hash", unique=True),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_email: str
     bank: str
     date_start: date
     date_end: date
     uploaded_at: datetime = Field(default_factory=datetime.utcnow)
+    content_hash: Optional[str] = None  # SHA-256 исходного PDF
+
+class IngestJob(SQLModel, table=True):
+    id: str = Field(default_factory=lambda: uuid4().hex, primary_key=True)
+    user_email: str = Field(index=True)
+    bank: Optional[str] = None  # None — определить по первой странице
+    filename: str
+    content_hash: Optional[str] = None
+    status: str = "pending"  # pending | running | done | failed
+    pages_total: int = 0
+    pages_parsed: int = 0
+    rows_parsed: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    statement_id: Optional[int] = Field(default=None, foreign_key="statement.id")
+    error: Optional[str] = None
+    # PDF хранится до окончания разбора, чтобы задача пережила перезапуск воркера
+    payload: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary))
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
 
 class FinancialGoal(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -43,6 +101,14 @@ engine = create_engine(DATABASE_URL, echo=False)
 def init_db():
     SQLModel.metadata.create_all(engine)
 
+def get_data_version(session: Session, user_email: str) -> int:
+    version = session.exec(select(User.data_version).where(User.email == user_email)).first()
+    return version or 0
+
+def bump_data_version(session: Session, user_email: str):
+    """Вызывается в той же транзакции, что и изменение операций: закоммитили данные — сменилась версия."""
+    session.exec(update(User).where(User.email == user_email).values(data_version=User.data_version + 1))
+
 def get_session():
     with Session(engine) as session:
         yield session
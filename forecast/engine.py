@@ -0,0 +1,76 @@
+"""
+Прогноз расходов линейным трендом по месяцам.
+
+Все ряды решаются разом: на вход — матрица месяц × категория и маска заполненных ячеек,
+наклон и сдвиг каждого столбца считаются в замкнутом виде (МНК), без цикла по категориям
+и без sklearn. Результат совпадает с LinearRegression, обученной на каждом ряду отдельно:
+x — порядковый номер месяца среди месяцев, где у категории были расходы.
+"""
+import numpy as np
+
+MIN_MONTHS = 3  # меньше — тренд не строим
+
+
+def fit_trends(values, mask=None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    МНК y = a + b·x по каждому столбцу values. Возвращает (a, b, n) — массивы по столбцам,
+    n — число заполненных месяцев. Для столбца из одной точки b = 0, как у sklearn.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        values = values[:, None]
+    mask = np.ones(values.shape, dtype=bool) if mask is None else np.asarray(mask, dtype=bool).reshape(values.shape)
+
+    x = np.cumsum(mask, axis=0) - 1.0
+    n = mask.sum(axis=0)
+    safe_n = np.maximum(n, 1)
+    x_mean = np.where(mask, x, 0.0).sum(axis=0) / safe_n
+    y_mean = np.where(mask, values, 0.0).sum(axis=0) / safe_n
+
+    # Центрированные суммы — так же считает sklearn, точность не теряется на больших суммах
+    xc = np.where(mask, x - x_mean, 0.0)
+    yc = np.where(mask, values - y_mean, 0.0)
+    sxx = (xc * xc).sum(axis=0)
+    slope = np.divide((xc * yc).sum(axis=0), sxx, out=np.zeros_like(sxx), where=sxx > 0)
+    return y_mean - slope * x_mean, slope, n
+
+
+def predict_next(values, mask=None, steps: int = 1) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Прогноз на steps месяцев вперёд по каждому столбцу. Возвращает (прогнозы steps × столбцы, n).
+    Первый прогнозный x — n, следующий за последним заполненным месяцем.
+    """
+    intercept, slope, n = fit_trends(values, mask)
+    x = n[None, :] + np.arange(steps)[:, None]
+    return intercept + slope * x, n
+
+
+def forecast_total(monthly: list[float], horizon: int = 3) -> list[float]:
+    """Прогноз одного ряда помесячных сумм на horizon месяцев."""
+    predictions, _ = predict_next(monthly, steps=horizon)
+    return predictions[:, 0].tolist()
+
+
+def forecast_categories(matrix, mask, categories: list[str]) -> dict[str, float] | None:
+    """
+    Прогноз на следующий месяц по каждой категории, отмасштабированный так,
+    чтобы сумма совпала с прогнозом общего ряда (сумма по всем месяцам с расходами).
+    Категории, у которых меньше MIN_MONTHS месяцев, пропускаются; None — прогнозировать не по чему.
+    """
+    matrix = np.asarray(matrix, dtype=float)
+    mask = np.asarray(mask, dtype=bool)
+    predictions, n = predict_next(matrix, mask)
+    enough = n >= MIN_MONTHS
+    if not enough.any():
+        return None
+
+    by_category = predictions[0][enough]
+    total_months = mask.any(axis=1)
+    overall = predict_next(matrix.sum(axis=1)[total_months])[0][0, 0]
+
+    total = by_category.sum()
+    scale = overall / total if total != 0 else 1.0
+    return {
+        category: float(amount)
+        for category, amount in zip(np.asarray(categories)[enough].tolist(), by_category * scale)
+    }
@@ -1,10 +1,16 @@
-import pandas as pd
-import numpy as np
-from fastapi import APIRouter, HTTPException, Query, Body
+from fastapi import APIRouter, HTTPException, Query, Body, Depends, Request, Response
+from sqlmodel import Session
 from pydantic import BaseModel
 from typing import List
-from sklearn.linear_model import LinearRegression
+from datetime import datetime
 from pydantic import BaseModel, Field
+from forecast.utils import (
+    total_forecast, category_forecast, monthly_expenses, monthly_category_expenses,
+    stored_forecast, stored_category_forecast, forecast_cache
+)
+from database import engine
+from auth.utils import get_current_user
+from cache import cached
 
 
 router = APIRouter(prefix="/forecast", tags=["Forecast"])
@@ -29,45 +35,8 @@ class CategoryForecastResponse(BaseModel):
 @router.post("/")
 def get_forecast(req: ForecastRequest):
     try:
-        transactions_data = [t.model_dump() for t in req.transactions]
-        df = pd.DataFrame(transactions_data)
-
-        if df.empty:
-            raise HTTPException(status_code=400, detail="Данные не распарсились — пустой DataFrame")
-
-        df['date'] = pd.to_datetime(df['date'], errors='coerce')
-        df = df.dropna(subset=['date'])
-        df = df[~df['is_income']]
-        df = df[~df['category'].isin(["Переводы", "Пополнения", "Пополнение"])]
-
-        latest_date = df['date'].max()
-        one_year_ago = latest_date - pd.DateOffset(months=12)
-        df = df[df['date'] >= one_year_ago]
-
-        if df.empty:
-            raise HTTPException(status_code=400, detail="Нет расходов за последние 12 месяцев")
-
-        df['year_month'] = df['date'].dt.to_period('M').astype(str)
-        monthly = df.groupby('year_month')['cost'].sum().reset_index()
-        monthly['month_index'] = range(len(monthly))
-
-        if len(monthly) < 3:
-            raise HTTPException(status_code=400, detail="Недостаточно месяцев для прогноза (нужно ≥ 3)")
-
-        model = LinearRegression()
-        X = monthly[['month_index']]
-        y = monthly['cost']
-        model.fit(X, y)
-
-        future_indexes = np.array([[i] for i in range(len(monthly), len(monthly) + 3)])
-        predictions = model.predict(future_indexes)
-
-        last_date = pd.to_datetime(monthly['year_month'].iloc[-1] + "-01")
-        future_months = [(last_date + pd.DateOffset(months=i + 1)).strftime("%Y-%m") for i in range(3)]
-
-        result = [{"month": m, "amount": round(a, 2)} for m, a in zip(future_months, predictions)]
-
-        return {"forecast": result}
+        months, values = monthly_expenses(req.transactions)
+        return total_forecast(months, values)
 
     except Exception as e:
         print("Ошибка прогноза:", e)
@@ -80,82 +49,49 @@ def forecast_categories(
 ):
     try:
         try:
-            target_date = pd.to_datetime(month + "-01", format="%Y-%m-%d")
+            target_date = datetime.strptime(month + "-01", "%Y-%m-%d")
         except Exception:
             raise HTTPException(status_code=400, detail="Неверный формат месяца. Используйте YYYY-MM")
 
-        transactions_data = [t.model_dump() for t in req.transactions]
-        df = pd.DataFrame(transactions_data)
-
-        if df.empty:
-            raise HTTPException(status_code=400, detail="Данные не распарсились — пустой DataFrame")
-
-        df['date'] = pd.to_datetime(df['date'], errors='coerce')
-        df = df.dropna(subset=['date'])
-        df = df[~df['is_income']]
-        df = df[df['cost'] < 0]  # расходы отрицательны
-        df = df[~df['category'].isin(["Переводы", "Пополнения", "Пополнение"])]
-
-        start_date = target_date - pd.DateOffset(months=12)
-        df = df[(df['date'] >= start_date) & (df['date'] < target_date)]
-
-        if df.empty:
-            raise HTTPException(status_code=400, detail="Нет расходов для прогноза за указанный период")
-
-        df['year_month'] = df['date'].dt.to_period('M').astype(str)
-        monthly_cat = df.groupby(['year_month', 'category'])['cost'].sum().reset_index()
+        rows = monthly_category_expenses(req.transactions, target_date)
+        return category_forecast(month, rows)
 
-        categories = monthly_cat['category'].unique()
-
-        results = []
-        for cat in categories:
-            cat_data = monthly_cat[monthly_cat['category'] == cat].copy()
-            cat_data = cat_data.sort_values('year_month')
-            cat_data['month_index'] = range(len(cat_data))
-
-            if len(cat_data) < 3:
-                continue
-
-            X = cat_data[['month_index']]
-            y = cat_data['cost']
-            model = LinearRegression()
-            model.fit(X, y)
-
-            next_month_index = len(cat_data)
-            prediction = model.predict([[next_month_index]])[0]
-
-            results.append(CategoryForecastItem(category=cat, amount=prediction))
-
-        if not results:
-            raise HTTPException(status_code=400, detail="Недостаточно данных для прогноза по категориям")
+    except Exception as e:
+        print("Ошибка прогноза по категориям:", e)
+        raise HTTPException(status_code=500, detail=f"Ошибка прогноза по категориям: {e}")
 
-        # Сумма прогнозов по категориям
-        total_cat_forecast = sum(item.amount for item in results)
 
-        # Общий прогноз за месяц (из общей модели, либо можно посчитать здесь)
-        # Для примера возьмем общую сумму расходов за последний год и линейную регрессию
-        monthly_total = df.groupby('year_month')['cost'].sum().reset_index()
-        monthly_total = monthly_total.sort_values('year_month')
-        monthly_total['month_index'] = range(len(monthly_total))
-        model_total = LinearRegression()
-        model_total.fit(monthly_total[['month_index']], monthly_total['cost'])
-        overall_prediction = model_total.predict([[len(monthly_total)]])[0]
+@router.get("/")
+def get_stored_forecast(request: Request, response: Response, user: dict = Depends(get_current_user)):
+    """Прогноз по уже загруженным операциям пользователя, из итогов по месяцам."""
+    with Session(engine) as session:
+        return cached(
+            session, user["email"], "forecast", {},
+            lambda: stored_forecast(session, user["email"]),
+            request, response
+        )
 
-        # Коэффициент масштабирования
-        if total_cat_forecast != 0:
-            scale_factor = overall_prediction / total_cat_forecast
-        else:
-            scale_factor = 1.0
 
-        # Применяем масштабирование и округляем
-        for item in results:
-            item.amount = round(item.amount * scale_factor, 2)
+@router.get("/categories/", response_model=CategoryForecastResponse)
+def get_stored_category_forecast(
+    request: Request,
+    response: Response,
+    month: str = Query(..., description="Месяц в формате YYYY-MM"),
+    user: dict = Depends(get_current_user)
+):
+    try:
+        month = datetime.strptime(month, "%Y-%m").strftime("%Y-%m")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Неверный формат месяца. Используйте YYYY-MM")
 
-        # Сортируем и берем топ-3, как и раньше
-        results = sorted(results, key=lambda x: abs(x.amount), reverse=True)[:3]
+    with Session(engine) as session:
+        return cached(
+            session, user["email"], "forecast/categories", {"month": month},
+            lambda: stored_category_forecast(session, user["email"], month),
+            request, response
+        )
 
-        return CategoryForecastResponse(month=month, categories=results)
 
-    except Exception as e:
-        print("Ошибка прогноза по категориям:", e)
-        raise HTTPException(status_code=500, detail=f"Ошибка прогноза по категориям: {e}")
+@router.get("/cache")
+def get_forecast_cache_stats(user: dict = Depends(get_current_user)):
+    return forecast_cache.stats()
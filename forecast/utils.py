@@ -0,0 +1,197 @@
+"""
+Подготовка рядов и прогноз.
+
+Присланные операции сводятся в помесячный ряд одним проходом, без DataFrame.
+Прогноз зависит только от этого ряда, поэтому результат запоминается в LRU по sha256
+нормализованного ряда: клиент, присылающий ту же историю на каждом экране, регрессию
+повторно не запускает.
+"""
+import hashlib
+import json
+import math
+from collections import defaultdict
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from cache import MemoryBackend, ResultCache
+from config import FORECAST_CACHE_SIZE
+from database import MonthlyCategoryTotal
+from forecast import engine
+
+EXCLUDED_CATEGORIES = ["Переводы", "Пополнения", "Пополнение"]
+HORIZON = 3  # месяцев в общем прогнозе
+
+# Результат — чистая функция ряда, устаревать ему незачем: только LRU
+forecast_cache = ResultCache(MemoryBackend(FORECAST_CACHE_SIZE, math.inf))
+
+
+def shift_month(month: str, delta: int) -> str:
+    """'2025-01' + delta месяцев -> 'YYYY-MM'."""
+    return (date.fromisoformat(month + "-01") + relativedelta(months=delta)).strftime("%Y-%m")
+
+
+def category_matrix(rows) -> tuple[list[str], list[str], np.ndarray, np.ndarray]:
+    """
+    Строки (месяц, категория, сумма), отсортированные по месяцу и категории, -> (месяцы, категории,
+    матрица месяц × категория, маска заполненных ячеек). Категории — в порядке первого месяца с расходами.
+    """
+    months = sorted({month for month, _, _ in rows})
+    categories = list(dict.fromkeys(category for _, category, _ in rows))
+    month_index = {month: i for i, month in enumerate(months)}
+    category_index = {category: j for j, category in enumerate(categories)}
+
+    matrix = np.zeros((len(months), len(categories)))
+    mask = np.zeros(matrix.shape, dtype=bool)
+    for month, category, amount in rows:
+        i, j = month_index[month], category_index[category]
+        matrix[i, j] += amount
+        mask[i, j] = True
+    return months, categories, matrix, mask
+
+
+def series_key(kind: str, *series) -> str:
+    """Отпечаток нормализованного ряда: месяцы 'YYYY-MM', суммы float, порядок — по месяцу (и категории)."""
+    payload = json.dumps([kind, *series], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def total_forecast(months: list[str], values: list[float]) -> dict:
+    """Прогноз помесячных сумм на HORIZON месяцев после последнего месяца ряда."""
+    if len(values) < engine.MIN_MONTHS:
+        raise HTTPException(status_code=400, detail="Недостаточно месяцев для прогноза (нужно ≥ 3)")
+    values = [float(value) for value in values]
+    return forecast_cache.get_or_compute(
+        series_key("total", months, values), lambda: _total_forecast(months, values)
+    )
+
+
+def _total_forecast(months: list[str], values: list[float]) -> dict:
+    predictions = engine.forecast_total(values, horizon=HORIZON)
+    return {"forecast": [
+        {"month": shift_month(months[-1], i + 1), "amount": round(amount, 2)}
+        for i, amount in enumerate(predictions)
+    ]}
+
+
+def category_forecast(month: str, rows) -> dict:
+    """Топ-3 категории прогноза на month; суммы отмасштабированы под общий прогноз месяца."""
+    rows = [(m, category, float(amount)) for m, category, amount in rows]
+    return forecast_cache.get_or_compute(
+        series_key("categories", month, rows), lambda: _category_forecast(month, rows)
+    )
+
+
+def _category_forecast(month: str, rows) -> dict:
+    _, categories, matrix, mask = category_matrix(rows)
+    forecasts = engine.forecast_categories(matrix, mask, categories) if categories else None
+    if not forecasts:
+        raise HTTPException(status_code=400, detail="Недостаточно данных для прогноза по категориям")
+
+    results = [{"category": category, "amount": round(amount, 2)} for category, amount in forecasts.items()]
+    results = sorted(results, key=lambda x: abs(x["amount"]), reverse=True)[:3]
+    return {"month": month, "categories": results}
+
+
+def parse_dates(values: list[str]) -> list[datetime | None]:
+    """
+    ISO-даты разбираем сами. Если хоть одна в другом формате — весь столбец, как раньше,
+    через pd.to_datetime(errors="coerce"); неразобранные даты — None.
+    """
+    try:
+        parsed = [datetime.fromisoformat(value) for value in values]
+        if not any(moment.tzinfo for moment in parsed):
+            return parsed
+    except ValueError:
+        pass
+    return [None if pd.isna(moment) else moment.to_pydatetime()
+            for moment in pd.to_datetime(pd.Series(values), errors="coerce")]
+
+
+def _expenses(transactions) -> list[tuple[datetime, float, str]]:
+    if not transactions:
+        raise HTTPException(status_code=400, detail="Данные не распарсились — пустой DataFrame")
+    dates = parse_dates([t.date for t in transactions])
+    return [
+        (moment, t.cost, t.category)
+        for moment, t in zip(dates, transactions)
+        if moment is not None and not t.is_income and t.category not in EXCLUDED_CATEGORIES
+    ]
+
+
+def monthly_expenses(transactions) -> tuple[list[str], list[float]]:
+    """Помесячные суммы расходов из присланных операций: последний год до самой поздней даты."""
+    expenses = _expenses(transactions)
+    if expenses:
+        one_year_ago = max(moment for moment, _, _ in expenses) - relativedelta(months=12)
+        expenses = [row for row in expenses if row[0] >= one_year_ago]
+    if not expenses:
+        raise HTTPException(status_code=400, detail="Нет расходов за последние 12 месяцев")
+
+    # Группируем по (год, месяц): строку 'YYYY-MM' собираем один раз на месяц, а не на операцию
+    sums = defaultdict(list)
+    for moment, cost, _ in expenses:
+        sums[moment.year, moment.month].append(cost)
+    months = sorted(sums)
+    return [f"{year:04d}-{month:02d}" for year, month in months], [math.fsum(sums[key]) for key in months]
+
+
+def monthly_category_expenses(transactions, target: datetime) -> list[tuple[str, str, float]]:
+    """(месяц, категория, сумма) расходов за 12 месяцев до target, по порядку месяца и категории."""
+    start = target - relativedelta(months=12)
+    sums = defaultdict(list)
+    for moment, cost, category in _expenses(transactions):
+        if cost < 0 and start <= moment < target:
+            sums[moment.year, moment.month, category].append(cost)
+    if not sums:
+        raise HTTPException(status_code=400, detail="Нет расходов для прогноза за указанный период")
+    return [(f"{year:04d}-{month:02d}", category, math.fsum(costs))
+            for (year, month, category), costs in sorted(sums.items())]
+
+
+def _spend_filter(user_email: str):
+    return (
+        (MonthlyCategoryTotal.user_email == user_email) &
+        MonthlyCategoryTotal.category.not_in(EXCLUDED_CATEGORIES) &
+        (MonthlyCategoryTotal.spend > 0)
+    )
+
+
+def stored_forecast(session: Session, user_email: str) -> dict:
+    """
+    Общий прогноз по итогам monthly_category_totals: последний месяц с расходами и 12 месяцев до него.
+    Суммы со знаком минус, как в прогнозе по присланным операциям.
+    """
+    rows = session.exec(
+        select(MonthlyCategoryTotal.month, func.sum(MonthlyCategoryTotal.spend))
+        .where(_spend_filter(user_email))
+        .group_by(MonthlyCategoryTotal.month)
+        .order_by(MonthlyCategoryTotal.month)
+    ).all()
+    if not rows:
+        raise HTTPException(status_code=400, detail="Нет расходов за последние 12 месяцев")
+
+    start = shift_month(rows[-1][0], -12)
+    rows = [(month, -spend) for month, spend in rows if month >= start]
+    return total_forecast([month for month, _ in rows], [amount for _, amount in rows])
+
+
+def stored_category_forecast(session: Session, user_email: str, month: str) -> dict:
+    """Прогноз по категориям на month по итогам 12 месяцев до него."""
+    rows = session.exec(
+        select(MonthlyCategoryTotal.month, MonthlyCategoryTotal.category, MonthlyCategoryTotal.spend)
+        .where(
+            _spend_filter(user_email) &
+            (MonthlyCategoryTotal.month >= shift_month(month, -12)) &
+            (MonthlyCategoryTotal.month < month)
+        )
+        .order_by(MonthlyCategoryTotal.month, MonthlyCategoryTotal.category)
+    ).all()
+    if not rows:
+        raise HTTPException(status_code=400, detail="Нет расходов для прогноза за указанный период")
+    return category_forecast(month, [(m, category, -spend) for m, category, spend in rows])
@@ -8,15 +8,30 @@ from statements.routes import router as statements_router
 from transactions.routes import router as transactions_router
 from goals.routes import router as goals_router
 from forecast.routes import router as forecast_router
+from dashboard.routes import router as dashboard_router
 
 
 app = FastAPI()
 
 from database import init_db
+from migrations import run_migrations
+from transactions.pool import parse_pool
+from transactions.jobs import resume_jobs, release_jobs
 
 @app.on_event("startup")
 def on_startup():
     init_db()
+    run_migrations()
+    parse_pool.start()
+
+@app.on_event("startup")
+async def resume_ingest_jobs():
+    resume_jobs()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    release_jobs()
+    parse_pool.shutdown()
 
 app.include_router(auth_router, prefix="/auth")
 app.include_router(analytics_router)
@@ -25,4 +40,5 @@ app.include_router(portrait_router)
 app.include_router(statements_router)
 app.include_router(goals_router, prefix="/goals", tags=["Goals"])
 app.include_router(forecast_router)
+app.include_router(dashboard_router)
 
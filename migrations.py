@@ -0,0 +1,129 @@
+from collections import Counter
+
+from sqlalchemy import inspect, text
+from sqlmodel import SQLModel, Session
+
+from analytics.rollup import rebuild_rollup
+from database import engine
+from transactions.ingest import canonical_bank, transaction_fingerprint, parse_op_date
+from transactions.rules import merchant_key
+from transactions.utils import BANK_NAMES
+
+
+def add_missing_columns(conn) -> set[tuple[str, str]]:
+    """create_all не меняет существующие таблицы — досоздаём новые колонки через ALTER TABLE."""
+    inspector = inspect(conn)
+    added = set()
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            col_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {col_type}'))
+            added.add((table.name, column.name))
+    return added
+
+
+def create_missing_indexes(conn):
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def backfill_fingerprints(conn):
+    rows = conn.execute(text(
+        'SELECT id, user_email, bank, date, cost, description FROM "transaction" '
+        'WHERE fingerprint IS NULL ORDER BY id'
+    )).all()
+
+    seen = Counter()
+    updates = []
+    for row in rows:
+        key = (row.user_email, canonical_bank(row.bank), row.date, round(row.cost, 2), row.description)
+        updates.append({
+            "id": row.id,
+            "fp": transaction_fingerprint(row.user_email, row.bank, row.date, row.cost, row.description, seen[key]),
+        })
+        seen[key] += 1
+
+    if updates:
+        conn.execute(text('UPDATE "transaction" SET fingerprint = :fp WHERE id = :id'), updates)
+
+
+def backfill_merchants(conn):
+    rows = conn.execute(text('SELECT id, description FROM "transaction" WHERE merchant IS NULL')).all()
+    if rows:
+        conn.execute(
+            text('UPDATE "transaction" SET merchant = :merchant WHERE id = :id'),
+            [{"id": row.id, "merchant": merchant_key(row.description)} for row in rows]
+        )
+
+
+def backfill_op_dates(conn):
+    rows = conn.execute(text('SELECT id, date FROM "transaction" WHERE op_date IS NULL')).all()
+    updates = []
+    for row in rows:
+        op_date = parse_op_date(row.date)
+        if op_date is not None:
+            updates.append({"id": row.id, "op_date": op_date.isoformat()})
+    if updates:
+        conn.execute(text('UPDATE "transaction" SET op_date = :op_date WHERE id = :id'), updates)
+
+
+def backfill_data_versions(conn):
+    conn.execute(text('UPDATE "user" SET data_version = 0 WHERE data_version IS NULL'))
+
+
+BACKFILLS = {
+    ("transaction", "fingerprint"): backfill_fingerprints,
+    ("transaction", "merchant"): backfill_merchants,
+    ("transaction", "op_date"): backfill_op_dates,
+    ("user", "data_version"): backfill_data_versions,
+}
+
+
+def canonicalize_banks(conn):
+    """
+    Раньше bank сохранялся в написании клиента ('Tinkoff', 'tinkoff') — приводим к каноническому,
+    иначе фильтр по банку и проверка периода выписки не видят такие строки.
+    Дёшево и идемпотентно, поэтому выполняется на каждом старте; версию данных поднимаем
+    только затронутым пользователям — сменились значения в их выдаче.
+    """
+    stale = "lower(bank) = :alias AND bank != :bank"
+    emails = set()
+    for table in ("transaction", "statement"):
+        for alias, bank in BANK_NAMES.items():
+            params = {"alias": alias, "bank": bank}
+            emails.update(conn.execute(
+                text(f'SELECT DISTINCT user_email FROM "{table}" WHERE {stale}'), params
+            ).scalars())
+            conn.execute(text(f'UPDATE "{table}" SET bank = :bank WHERE {stale}'), params)
+    if emails:
+        conn.execute(
+            text('UPDATE "user" SET data_version = data_version + 1 WHERE email = :email'),
+            [{"email": email} for email in emails]
+        )
+
+
+def build_rollup_if_empty(conn):
+    """Таблица итогов только что создана на базе с операциями — заполняем её целиком."""
+    has_totals = conn.execute(text("SELECT 1 FROM monthly_category_totals LIMIT 1")).first()
+    has_transactions = conn.execute(text('SELECT 1 FROM "transaction" LIMIT 1')).first()
+    if has_transactions and not has_totals:
+        with Session(bind=conn) as session:
+            rebuild_rollup(session)
+            session.flush()
+
+
+def run_migrations():
+    with engine.begin() as conn:
+        added = add_missing_columns(conn)
+        for column, backfill in BACKFILLS.items():
+            if column in added:
+                backfill(conn)
+        canonicalize_banks(conn)
+        create_missing_indexes(conn)
+        build_rollup_if_empty(conn)
@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response, Depends
 from sqlmodel import Session, select
 from database import engine, Transaction as DBTransaction
 from jose import jwt
-from datetime import date
+from datetime import date, datetime
+from collections import defaultdict
 
-from portrait.utils import portrait_of_month, cluster_days, Transaction as PTransaction
+from portrait.utils import portrait_from_rows, clusters_from_rows, month_bounds
+from auth.utils import get_current_user
+from config import PORTRAIT_RANGE_MAX_MONTHS
+from cache import cached
 
 router = APIRouter()
 SECRET = "supersecretkey"
@@ -12,6 +16,8 @@ ALGO = "HS256"
 
 @router.get("/portrait")
 def get_month_portrait(
+    request: Request,
+    response: Response,
     authorization: str = Header(...),
     month: int = Query(None, ge=1, le=12),
     year: int = Query(None, ge=2000, le=2100)
@@ -29,22 +35,89 @@ def get_month_portrait(
         year = today.year
 
     with Session(engine) as session:
-        db_transactions = session.exec(
-            select(DBTransaction).where(DBTransaction.user_email == user_email)
-        ).all()
+        return cached_portrait(session, user_email, month, year, request, response)
 
-    transactions = [
-        PTransaction(
-            date=tx.date,
-            cost=tx.cost,
-            category=tx.category
-        ) for tx in db_transactions
-    ]
 
-    portrait = portrait_of_month(transactions, month=month, year=year)
-    patterns = cluster_days(transactions, month=month, year=year)
+def cached_portrait(session: Session, user_email: str, month: int, year: int,
+                    request: Request | None = None, response: Response | None = None):
+    return cached(
+        session, user_email, "portrait", {"month": month, "year": year},
+        lambda: month_portrait(session, user_email, month, year),
+        request, response
+    )
 
+
+def month_portrait(session: Session, user_email: str, month: int, year: int):
+    item = range_portraits(session, user_email, (year, month), (year, month))[0]
     return {
-        "portrait": portrait,
-        "patterns": patterns
+        "portrait": item["portrait"],
+        "patterns": item["patterns"]
     }
+
+
+def range_portraits(session: Session, user_email: str, start: tuple[int, int], end: tuple[int, int]):
+    """
+    Портреты и типы дней за месяцы от start до end включительно, (год, месяц).
+    Один запрос за весь диапазон: даты уже разобраны при загрузке (op_date),
+    строки раскладываются по месяцам за один проход.
+    """
+    first_day = month_bounds(start[1], start[0])[0]
+    last_day = month_bounds(end[1], end[0])[1]
+
+    by_month = defaultdict(list)
+    for op_date, cost, category in session.exec(
+        select(DBTransaction.op_date, DBTransaction.cost, DBTransaction.category)
+        .where(
+            (DBTransaction.user_email == user_email) &
+            (DBTransaction.op_date >= first_day) &
+            (DBTransaction.op_date <= last_day)
+        )
+        # Порядок загрузки, как при переборе всех операций: от него зависит, какая из категорий
+        # с равным числом операций попадёт в топ (Counter.most_common) и какое выйдет настроение
+        .order_by(DBTransaction.id)
+    ):
+        by_month[op_date.year, op_date.month].append((op_date, cost, category))
+
+    result = []
+    year, month = start
+    while (year, month) <= end:
+        rows = by_month[year, month]
+        result.append({
+            "year": year,
+            "month": month,
+            "portrait": portrait_from_rows(rows, month, year),
+            "patterns": clusters_from_rows(rows)
+        })
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return result
+
+
+def parse_month(value: str, name: str) -> tuple[int, int]:
+    try:
+        moment = datetime.strptime(value, "%Y-%m")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Неверный формат {name}. Используйте YYYY-MM")
+    return moment.year, moment.month
+
+
+@router.get("/portrait/range")
+def get_range_portraits(
+    request: Request,
+    response: Response,
+    from_: str = Query(..., alias="from", description="Первый месяц, YYYY-MM"),
+    to: str = Query(..., description="Последний месяц включительно, YYYY-MM"),
+    user: dict = Depends(get_current_user)
+):
+    start, end = parse_month(from_, "from"), parse_month(to, "to")
+    if start > end:
+        raise HTTPException(status_code=400, detail="from позже to")
+    months = (end[0] - start[0]) * 12 + end[1] - start[1] + 1
+    if months > PORTRAIT_RANGE_MAX_MONTHS:
+        raise HTTPException(status_code=400, detail=f"Не больше {PORTRAIT_RANGE_MAX_MONTHS} месяцев за запрос")
+
+    with Session(engine) as session:
+        return cached(
+            session, user["email"], "portrait/range", {"from": start, "to": end},
+            lambda: range_portraits(session, user["email"], start, end),
+            request, response
+        )
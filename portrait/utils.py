@@ -1,8 +1,7 @@
-from datetime import datetime, date, timedelta
+from datetime import datetime, date
 from calendar import monthrange
 from collections import defaultdict, Counter
-import numpy as np
-from sklearn.cluster import KMeans
+from bisect import bisect_left
 from pydantic import BaseModel
 
 MOOD_BY_CATEGORY = {
@@ -30,40 +29,36 @@ def safe_parse_date(date_str: str) -> datetime.date:
             continue
     raise ValueError(f"⛔ Неподдерживаемый формат даты: {date_str}")
 
-def portrait_of_month(transactions, month: int, year: int):
-    first_day = date(year, month, 1)
-    last_day = first_day.replace(day=monthrange(year, month)[1])
+MONTH_NAMES = ["январь", "февраль", "март", "апрель", "май", "июнь",
+               "июль", "август", "сентябрь", "октябрь", "ноябрь", "декабрь"]
 
-    tx_objects = [Transaction(**tx) if isinstance(tx, dict) else tx for tx in transactions]
+def month_bounds(month: int, year: int) -> tuple[date, date]:
+    first_day = date(year, month, 1)
+    return first_day, first_day.replace(day=monthrange(year, month)[1])
 
-    months = ["январь", "февраль", "март", "апрель", "май", "июнь",
-              "июль", "август", "сентябрь", "октябрь", "ноябрь", "декабрь"]
-    month_name = months[month - 1].capitalize()
+def _in_month(rows, month: int, year: int):
+    first_day, last_day = month_bounds(month, year)
+    return [row for row in rows if first_day <= row[0] <= last_day]
 
-    month_txs = [
-        tx for tx in tx_objects
-        if first_day <= safe_parse_date(tx.date) <= last_day
-        and tx.category not in PORTRAIT_BLACKLIST
-    ]
+def portrait_of_month(transactions, month: int, year: int):
+    tx_objects = [Transaction(**tx) if isinstance(tx, dict) else tx for tx in transactions]
+    rows = [(safe_parse_date(tx.date), tx.cost, tx.category) for tx in tx_objects]
+    return portrait_from_rows(_in_month(rows, month, year), month, year)
 
-    print(f"🔍 Портрет за {month}.{year}, транзакций: {len(tx_objects)}")
+def portrait_from_rows(rows, month: int, year: int):
+    """Портрет месяца по уже разобранным операциям этого месяца: (дата, сумма, категория)."""
+    month_name = MONTH_NAMES[month - 1].capitalize()
 
-    for tx in tx_objects:
-        try:
-            parsed_date = safe_parse_date(tx.date)
-            if first_day <= parsed_date <= last_day:
-                print(f"✅ {tx.date} -> ok | {tx.category} | {tx.cost}")
-        except Exception as e:
-            print(f"❌ {tx.date} -> ошибка парсинга: {e}")
+    month_txs = [(cost, category) for _, cost, category in rows if category not in PORTRAIT_BLACKLIST]
 
     if not month_txs:
         return {"status": "no_data", "message": f"⚪️ {month_name} — нет расходов для анализа"}
 
     sums = defaultdict(float)
     counts = Counter()
-    for tx in month_txs:
-        sums[tx.category] += abs(tx.cost)
-        counts[tx.category] += 1
+    for cost, category in month_txs:
+        sums[category] += abs(cost)
+        counts[category] += 1
 
     total = sum(sums.values())
     top_cat = max(sums, key=sums.get)
@@ -89,36 +84,80 @@ def portrait_of_month(transactions, month: int, year: int):
                    f"Топ категории: {', '.join(top3)}. Настроение: {mood}."
     }
 
-def cluster_days(transactions, month: int, year: int):
-    first_day = date(year, month, 1)
-    last_day = (first_day.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
-    daily = defaultdict(float)
+def optimal_breaks(values: list[float], k: int) -> list[tuple[float, float]]:
+    """
+    Оптимальное разбиение чисел на k кластеров в 1-D (минимум суммы квадратов отклонений от центров),
+    динамикой по отсортированным значениям, как в Ckmeans.1d.dp. Одинаковые значения всегда в одном
+    кластере; если различных значений меньше k — кластеров столько, сколько значений.
+    Возвращает [(верхняя граница, центр)] по возрастанию.
+    """
+    counts = Counter(values)
+    points = sorted(counts)
+    n = len(points)
+    k = min(k, n)
+
+    # Префиксные суммы весов, значений и квадратов: SSE любого отрезка за O(1)
+    w, s1, s2 = [0], [0.0], [0.0]
+    for x in points:
+        c = counts[x]
+        w.append(w[-1] + c)
+        s1.append(s1[-1] + c * x)
+        s2.append(s2[-1] + c * x * x)
+
+    # cost[m][j] — лучшая цена (SSE) первых j точек в m кластерах, start[m][j] — начало последнего кластера
+    cost = [[0.0] * (n + 1) for _ in range(k + 1)]
+    start = [[0] * (n + 1) for _ in range(k + 1)]
+    for j in range(1, n + 1):
+        cost[1][j] = s2[j] - s1[j] * s1[j] / w[j]
+    for m in range(2, k + 1):
+        previous = cost[m - 1]
+        # Последнему слою нужна только полная длина, остальным — оставить точки следующим кластерам
+        for j in ([n] if m == k else range(m, n - k + m + 1)):
+            best, best_i = float("inf"), m - 1
+            for i in range(m - 1, j):
+                total = s1[j] - s1[i]
+                candidate = previous[i] + s2[j] - s2[i] - total * total / (w[j] - w[i])
+                if candidate < best:
+                    best, best_i = candidate, i
+            cost[m][j], start[m][j] = best, best_i
+
+    segments = []
+    j = n
+    for m in range(k, 0, -1):
+        i = start[m][j]
+        segments.append((points[j - 1], (s1[j] - s1[i]) / (w[j] - w[i])))
+        j = i
+    return segments[::-1]
 
+def cluster_days(transactions, month: int, year: int):
     tx_objects = [Transaction(**tx) if isinstance(tx, dict) else tx for tx in transactions]
-
+    rows = []
     for tx in tx_objects:
         try:
-            tx_date = safe_parse_date(tx.date)
-        except:
+            rows.append((safe_parse_date(tx.date), tx.cost, tx.category))
+        except ValueError:
             continue
-        if first_day <= tx_date <= last_day and tx.category not in PORTRAIT_BLACKLIST:
-            daily[tx_date] += abs(tx.cost)
+    return clusters_from_rows(_in_month(rows, month, year))
+
+def clusters_from_rows(rows):
+    """Типы дней месяца по уже разобранным операциям этого месяца: (дата, сумма, категория)."""
+    daily = defaultdict(float)
+    for tx_date, cost, category in rows:
+        if category not in PORTRAIT_BLACKLIST:
+            daily[tx_date] += abs(cost)
 
     if not daily:
         return []
 
-    X = np.array([[v] for v in daily.values()])
-    k = min(3, len(X))
-    km = KMeans(n_clusters=k, n_init="auto", random_state=42).fit(X)
-
-    order = np.argsort(km.cluster_centers_.ravel())
-    relabel = {old: new for new, old in enumerate(order)}
+    # Точное разбиение на k отрезков по возрастанию суммы; кластеры уже упорядочены по центру
+    segments = optimal_breaks(list(daily.values()), 3)
+    uppers = [upper for upper, _ in segments]
+    centers = [center for _, center in segments]
 
     clusters = defaultdict(list)
-    for (d, amt), lbl in zip(daily.items(), km.labels_):
-        clusters[relabel[lbl]].append((d, amt))
+    for d, amt in daily.items():
+        clusters[bisect_left(uppers, amt)].append((d, amt))
 
-    centers = km.cluster_centers_.ravel()[order]
     names = ['Экономные', 'Сбалансированные', 'Щедрые']
     result = []
 
@@ -0,0 +1,25 @@
+"""
+Быстрый путь для больших списков.
+
+Строки собираются в dict прямо из кортежей столбцов и сериализуются orjson, без
+промежуточных Pydantic-моделей и повторной проверки через response_model.
+Выключается FAST_JSON=0; без установленного orjson тоже работает прежний путь.
+"""
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+
+from config import FAST_JSON
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def fast_json_enabled() -> bool:
+    return FAST_JSON and orjson is not None
+
+
+def json_rows(rows: list[dict], response: Response) -> ORJSONResponse:
+    # Готовый Response FastAPI отдаёт как есть — заголовки (ETag, пагинация) переносим сами
+    return ORJSONResponse(rows, headers=dict(response.headers))
@@ -1,15 +1,16 @@
-from fastapi import APIRouter, Header, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Request, Response
 from sqlmodel import Session, select
 from database import engine, Statement as DBStatement
 from jose import jwt
 from database import engine
+from cache import not_modified
 
 router = APIRouter()
 SECRET = "supersecretkey"
 ALGO = "HS256"
 
 @router.get("/statements")
-def get_statements(authorization: str = Header(...)):
+def get_statements(request: Request, response: Response, authorization: str = Header(...)):
     try:
         token = authorization.split(" ")[1]
         payload = jwt.decode(token, SECRET, algorithms=[ALGO])
@@ -18,6 +19,9 @@ def get_statements(authorization: str = Header(...)):
         raise HTTPException(401, "Invalid or expired token")
 
     with Session(engine) as session:
+        unchanged = not_modified(request, response, session, user_email, "statements")
+        if unchanged is not None:
+            return unchanged
         statements = session.exec(
             select(DBStatement).where(DBStatement.user_email == user_email)
         ).all()
@@ -0,0 +1,38 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+from uuid import uuid4
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+DATA = Path(__file__).resolve().parent / "data"
+
+sys.path.insert(0, str(ROOT))
+# database.py открывает ./transactions.db — каждый прогон работает в своём временном каталоге
+os.chdir(tempfile.mkdtemp(prefix="finance-tests-"))
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def user(client):
+    """Новый пользователь на каждый тест: (email, заголовки авторизации)."""
+    email = f"{uuid4().hex}@test.ru"
+    client.post("/auth/register", json={"email": email, "password": "secret"})
+    token = client.post("/auth/login", json={"email": email, "password": "secret"}).json()["access_token"]
+    return email, {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def tbank_pdf() -> bytes:
+    """Выписка Т-Банка: 12 операций за январь 2025."""
+    return (DATA / "tbank.pdf").read_bytes()
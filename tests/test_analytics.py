@@ -0,0 +1,40 @@
+from datetime import date, datetime
+
+from sqlmodel import Session
+
+from analytics.rollup import rebuild_rollup
+from analytics.utils import generate_monthly_stats
+from database import engine, Transaction as DBTransaction
+
+
+def test_monthly_categories_keep_first_transaction_order(user):
+    email, _ = user
+    rows = [
+        (date(2025, 3, 20), -50.0, "ЖКХ"),
+        (date(2025, 3, 2), -900.0, "Магазины"),
+        (date(2025, 3, 5), -10.0, "Другие"),
+        (date(2025, 3, 6), -300.0, "Кофейни"),
+        (date(2025, 3, 7), -40.0, "ЖКХ"),
+        (date(2025, 4, 1), -5.0, "Кофейни"),
+        (date(2025, 4, 2), -700.0, "ЖКХ"),
+    ]
+    with Session(engine) as session:
+        session.add_all(DBTransaction(
+            date=op_date.strftime("%d.%m.%Y"), op_date=op_date, time=None, cost=cost,
+            description=f"Оплата {category}", category=category, bank="tbank",
+            user_email=email, created_at=datetime.utcnow(),
+        ) for op_date, cost, category in rows)
+        session.flush()
+        rebuild_rollup(session, email)
+        session.commit()
+
+        stats = generate_monthly_stats(session, email, now=datetime(2025, 4, 15))
+
+    assert [(row["month"], row["category"], row["amount"]) for row in stats] == [
+        ("Мар", "ЖКХ", 90.0),
+        ("Мар", "Магазины", 900.0),
+        ("Мар", "Другие", 10.0),
+        ("Мар", "Кофейни", 300.0),
+        ("Апр", "Кофейни", 5.0),
+        ("Апр", "ЖКХ", 700.0),
+    ]
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session
+
+from database import engine
+from migrations import canonicalize_banks
+
+
+@pytest.mark.parametrize("upload_as, filter_by", [
+    ("tinkoff", "tbank"),
+    ("Tinkoff", "tinkoff"),
+    ("tbank", "Tinkoff"),
+])
+def test_filter_by_bank_alias(client, user, tbank_pdf, upload_as, filter_by):
+    _, headers = user
+    r = client.post(
+        "/transactions/upload", files={"file": ("statement.pdf", tbank_pdf)},
+        data={"bank": upload_as}, headers=headers
+    )
+    assert r.status_code == 200, r.text
+    uploaded = len(r.json()["transactions"])
+    assert uploaded == 12
+
+    statements = client.get("/statements", headers=headers).json()
+    assert [s["bank"] for s in statements] == ["tbank"]
+
+    for path in ("/transactions/", "/transactions/history"):
+        rows = client.get(path, params={"bank": filter_by}, headers=headers).json()
+        assert len(rows) == uploaded
+        assert {row["bank"] for row in rows} == {"tbank"}
+
+    export = client.get("/transactions/export", params={"bank": filter_by}, headers=headers)
+    assert len([json.loads(line) for line in export.text.splitlines()]) == uploaded
+
+
+def test_canonicalize_legacy_banks(client, user):
+    email, headers = user
+    with engine.begin() as conn:
+        for bank in ("Tinkoff", "tinkoff", "TBANK", "Sber"):
+            conn.execute(text(
+                'INSERT INTO "transaction" (date, op_date, cost, description, category, bank, user_email, created_at) '
+                "VALUES ('05.01.2025', '2025-01-05', -100, 'Оплата', 'Прочее', :bank, :email, CURRENT_TIMESTAMP)"
+            ), {"bank": bank, "email": email})
+        canonicalize_banks(conn)
+
+    with Session(engine) as session:
+        banks = session.exec(
+            text('SELECT bank FROM "transaction" WHERE user_email = :email ORDER BY id').bindparams(email=email)
+        ).scalars().all()
+    assert banks == ["tbank", "tbank", "tbank", "sber"]
+
+    rows = client.get("/transactions/", params={"bank": "Tinkoff"}, headers=headers).json()
+    assert len(rows) == 3
@@ -0,0 +1,48 @@
+import json
+from datetime import date, datetime, timedelta
+
+from sqlmodel import Session
+
+from config import EXPORT_BATCH_ROWS
+from database import engine, Transaction as DBTransaction
+from transactions.export import export_ndjson
+from transactions.paging import transaction_filter
+
+
+def insert_transactions(email: str, count: int):
+    start = date(2024, 1, 1)
+    rows = [{
+        "date": (start + timedelta(days=i % 300)).strftime("%d.%m.%Y"),
+        "op_date": None if i % 97 == 0 else start + timedelta(days=i % 300),
+        "cost": -10.0,
+        "description": "Оплата",
+        "category": "Прочее",
+        "bank": "tbank",
+        "user_email": email,
+        "created_at": datetime.utcnow(),
+    } for i in range(count)]
+    with Session(engine) as session:
+        session.connection().execute(DBTransaction.__table__.insert(), rows)
+        session.commit()
+
+
+def test_export_matches_listing(client, user):
+    email, headers = user
+    insert_transactions(email, EXPORT_BATCH_ROWS * 2 + 10)
+
+    exported = client.get("/transactions/export", headers=headers).text.splitlines()
+    listed = client.get("/transactions/", headers=headers).json()
+    assert [json.loads(line)["id"] for line in exported] == [row["id"] for row in listed]
+
+
+def test_stalled_export_does_not_block_writers(client, user):
+    email, _ = user
+    insert_transactions(email, EXPORT_BATCH_ROWS + 10)
+
+    chunks = export_ndjson(transaction_filter(email))
+    first = next(chunks)
+    # Клиент «завис» после первой пачки — запись в БД всё равно проходит
+    insert_transactions(email, 1)
+
+    lines = (first + "".join(chunks)).splitlines()
+    assert len(lines) >= EXPORT_BATCH_ROWS + 10
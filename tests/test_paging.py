@@ -0,0 +1,69 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlmodel import Session
+
+import responses
+
+from config import PAGE_SIZE_DEFAULT
+from database import engine, Transaction as DBTransaction
+from transactions.routes import TRANSACTION_FIELDS
+
+
+def insert_transactions(email: str, count: int):
+    start = date(2024, 1, 1)
+    rows = [{
+        "date": (start + timedelta(days=i % 300)).strftime("%d.%m.%Y"),
+        "op_date": start + timedelta(days=i % 300),
+        "cost": -10.0,
+        "description": "Оплата",
+        "category": "Прочее",
+        "bank": "tbank",
+        "user_email": email,
+        "created_at": datetime.utcnow(),
+    } for i in range(count)]
+    with Session(engine) as session:
+        session.connection().execute(DBTransaction.__table__.insert(), rows)
+        session.commit()
+
+
+def test_without_limit_returns_everything(client, user):
+    email, headers = user
+    total = PAGE_SIZE_DEFAULT + 50
+    insert_transactions(email, total)
+
+    for path in ("/transactions/", "/transactions/history"):
+        r = client.get(path, headers=headers)
+        assert len(r.json()) == total
+        assert r.headers["X-Has-More"] == "false"
+
+        ids, cursor = [], None
+        while True:
+            params = {"limit": 70, **({"cursor": cursor} if cursor else {})}
+            page = client.get(path, params=params, headers=headers)
+            ids += [row["id"] for row in page.json()]
+            if page.headers["X-Has-More"] == "false":
+                break
+            cursor = page.headers["X-Next-Cursor"]
+        assert ids == [row["id"] for row in r.json()]
+
+
+def test_cursor_without_limit_pages_by_default(client, user):
+    email, headers = user
+    insert_transactions(email, PAGE_SIZE_DEFAULT + 50)
+
+    first = client.get("/transactions/", params={"limit": 10}, headers=headers)
+    rest = client.get("/transactions/", params={"cursor": first.headers["X-Next-Cursor"]}, headers=headers)
+    assert len(rest.json()) == PAGE_SIZE_DEFAULT
+    assert rest.headers["X-Has-More"] == "true"
+
+
+@pytest.mark.parametrize("fast_json", [True, False])
+def test_listing_exposes_only_public_fields(client, user, monkeypatch, fast_json):
+    email, headers = user
+    monkeypatch.setattr(responses, "FAST_JSON", fast_json)
+    insert_transactions(email, 3)
+
+    for params in ({}, {"limit": 2}):
+        rows = client.get("/transactions/", params=params, headers=headers).json()
+        assert rows and all(set(row) == set(TRANSACTION_FIELDS) for row in rows)
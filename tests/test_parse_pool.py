@@ -0,0 +1,44 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from transactions import ingest
+from transactions.pool import parse_pool
+
+
+def test_upload_recovers_after_worker_crash(client, user, tbank_pdf):
+    _, headers = user
+    with pytest.raises(BrokenProcessPool):
+        parse_pool.executor.submit(os._exit, 1).result()
+
+    def upload():
+        return client.post(
+            "/transactions/upload", files={"file": ("statement.pdf", tbank_pdf)}, headers=headers
+        )
+
+    # Загрузка, попавшая на сломанный пул, — 5xx; пул пересоздаётся, следующая проходит
+    assert upload().status_code == 500
+    r = upload()
+    assert r.status_code == 200, r.text
+    assert len(r.json()["transactions"]) == 12
+
+
+def test_pdf_bytes_are_not_sent_per_task(user, tbank_pdf, monkeypatch):
+    email, _ = user
+    executor = parse_pool.executor
+    submitted = []
+    submit = executor.submit
+
+    def spy(fn, *args):
+        submitted.append(args)
+        return submit(fn, *args)
+
+    monkeypatch.setattr(executor, "submit", spy)
+    monkeypatch.setattr(ingest, "PARSE_CHUNK_PAGES", 1)
+
+    report = ingest.ingest_pdf(tbank_pdf, email)
+    assert report["pages"] == 3 and report["inserted"] == 12
+    # Определение банка и два куска страниц — задачам уходит путь к файлу, а не сам PDF
+    assert len(submitted) == 3
+    assert not any(isinstance(arg, (bytes, bytearray)) for args in submitted for arg in args)
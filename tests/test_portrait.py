@@ -0,0 +1,48 @@
+from datetime import date, datetime
+
+from sqlmodel import Session
+
+from database import engine, Transaction as DBTransaction
+
+
+def insert_transactions(email: str, rows: list[tuple[date, float, str]]):
+    with Session(engine) as session:
+        session.connection().execute(DBTransaction.__table__.insert(), [{
+            "date": op_date.strftime("%d.%m.%Y"),
+            "op_date": op_date,
+            "cost": cost,
+            "description": category,
+            "category": category,
+            "bank": "tbank",
+            "user_email": email,
+            "created_at": datetime.utcnow(),
+        } for op_date, cost, category in rows])
+        session.commit()
+
+
+def test_range_matches_month_portrait_on_ties(client, user):
+    email, headers = user
+    # Порядок загрузки не совпадает с порядком дат; у категорий поровну операций
+    insert_transactions(email, [
+        (date(2025, 1, 20), -300.0, "Кофейни"),
+        (date(2025, 1, 5), -300.0, "Магазины"),
+        (date(2025, 1, 21), -300.0, "Кофейни"),
+        (date(2025, 1, 6), -300.0, "Магазины"),
+        (date(2025, 2, 25), -500.0, "Развлечения"),
+        (date(2025, 2, 2), -500.0, "Доставка"),
+        (date(2025, 2, 14), -500.0, "ЖКХ"),
+        (date(2025, 2, 1), -500.0, "Кофейни"),
+    ])
+
+    months = client.get("/portrait/range", params={"from": "2025-01", "to": "2025-02"}, headers=headers).json()
+    for item in months:
+        single = client.get(
+            "/portrait", params={"month": item["month"], "year": item["year"]}, headers=headers
+        ).json()
+        assert {"portrait": item["portrait"], "patterns": item["patterns"]} == single
+
+    january, february = (item["portrait"] for item in months)
+    assert january["top_categories"] == ["Кофейни", "Магазины"]
+    assert january["mood"] == "Беззаботный"
+    assert february["top_categories"] == ["Развлечения", "Доставка", "ЖКХ"]
+    assert february["mood"] == "Расслабленный"
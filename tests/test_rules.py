@@ -0,0 +1,44 @@
+from datetime import date, datetime
+
+from sqlmodel import Session, select
+
+from database import engine, Transaction as DBTransaction
+
+
+def insert_same_merchant(email: str, count: int) -> list[int]:
+    with Session(engine) as session:
+        txs = [DBTransaction(
+            date="10.01.2025", op_date=date(2025, 1, 10), time=None, cost=-100.0 - i,
+            description="Супермаркеты", category="Супермаркеты", bank="sber",
+            user_email=email, created_at=datetime.utcnow(), merchant="супермаркеты",
+        ) for i in range(count)]
+        session.add_all(txs)
+        session.commit()
+        return [tx.id for tx in txs]
+
+
+def categories(email: str) -> list[str]:
+    with Session(engine) as session:
+        return list(session.exec(
+            select(DBTransaction.category).where(DBTransaction.user_email == email).order_by(DBTransaction.id)
+        ).all())
+
+
+def test_patch_changes_only_one_transaction_by_default(client, user):
+    email, headers = user
+    ids = insert_same_merchant(email, 3)
+
+    r = client.patch(f"/transactions/{ids[0]}", json={"category": "Кофейни"}, headers=headers)
+    assert r.json()["updated"] == 1
+    assert categories(email) == ["Кофейни", "Супермаркеты", "Супермаркеты"]
+
+
+def test_patch_applies_rule_to_existing_on_request(client, user):
+    email, headers = user
+    ids = insert_same_merchant(email, 3)
+
+    r = client.patch(
+        f"/transactions/{ids[0]}", json={"category": "Кофейни", "apply_to_existing": True}, headers=headers
+    )
+    assert r.json()["updated"] == 3
+    assert categories(email) == ["Кофейни"] * 3
@@ -0,0 +1,63 @@
+import asyncio
+import json
+import time
+
+from transactions import jobs
+from transactions.pool import parse_pool
+
+
+def test_events_stream_until_done(client, user, tbank_pdf):
+    _, headers = user
+    r = client.post(
+        "/transactions/upload", files={"file": ("statement.pdf", tbank_pdf)},
+        data={"async_mode": "true"}, headers=headers
+    )
+    assert r.status_code == 202, r.text
+
+    events = []
+    with client.stream("GET", r.json()["events_url"], headers=headers) as stream:
+        event = None
+        for line in stream.iter_lines():
+            if line.startswith("event: "):
+                event = line.removeprefix("event: ")
+            elif line.startswith("data: "):
+                events.append((event, json.loads(line.removeprefix("data: "))))
+
+    event, state = events[-1]
+    assert event == "done"
+    assert state["status"] == "done", state["error"]
+    assert state["statement_id"] is not None
+    assert state["progress"]["inserted"] == 12
+    assert all(name == "progress" for name, _ in events[:-1])
+
+
+def test_events_for_unknown_job(client, user):
+    _, headers = user
+    assert client.get("/transactions/upload/missing/events", headers=headers).status_code == 404
+
+
+def test_queued_job_stays_fresh(client, user, tbank_pdf, monkeypatch):
+    _, headers = user
+    # Все места в пуле разбора заняты: задача ждёт в очереди
+    semaphore = asyncio.Semaphore(0)
+    monkeypatch.setattr(parse_pool, "_semaphore", semaphore)
+    monkeypatch.setattr(jobs, "JOB_HEARTBEAT", 0.05)
+
+    r = client.post(
+        "/transactions/upload", files={"file": ("statement.pdf", tbank_pdf)},
+        data={"async_mode": "true"}, headers=headers
+    )
+    status_url = r.json()["status_url"]
+    first = client.get(status_url, headers=headers).json()
+    time.sleep(0.3)
+    queued = client.get(status_url, headers=headers).json()
+    assert queued["status"] == "running"
+    assert queued["updated_at"] > first["updated_at"]
+
+    client.portal.call(semaphore.release)
+    for _ in range(100):
+        state = client.get(status_url, headers=headers).json()
+        if state["status"] in jobs.FINISHED:
+            break
+        time.sleep(0.1)
+    assert state["status"] == "done", state["error"]
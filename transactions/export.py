@@ -0,0 +1,70 @@
+"""
+Потоковая выгрузка всей истории операций в NDJSON или CSV.
+
+Строки читаются пачками по EXPORT_BATCH_ROWS с курсором по ключу (op_date, id), как в постраничной
+выдаче, и сразу уходят клиенту: память процесса не зависит от длины истории, а блокировка
+SQLite держится только на время чтения одной пачки.
+"""
+import csv
+import io
+import json
+
+from sqlmodel import Session
+
+from config import EXPORT_BATCH_ROWS
+from database import engine, Transaction as DBTransaction
+from transactions.paging import transaction_page
+
+EXPORT_FIELDS = ["id", "date", "time", "amount", "description", "category", "bank", "isIncome"]
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+EXPORT_COLUMNS = (
+    DBTransaction.id, DBTransaction.op_date, DBTransaction.date, DBTransaction.time,
+    DBTransaction.cost, DBTransaction.description, DBTransaction.category, DBTransaction.bank
+)
+
+
+def _export_batches(condition):
+    cursor = None
+    while True:
+        # Каждая пачка — своя короткая сессия: транзакция чтения не живёт, пока клиент качает,
+        # и не держит блокировку SQLite от загрузок и правок
+        with Session(engine) as session:
+            batch, cursor = transaction_page(session, condition, EXPORT_BATCH_ROWS, cursor, EXPORT_COLUMNS)
+        yield [
+            # Дата в ISO, как в /history; если дату не разобрали при загрузке — как в выписке
+            [tx_id, op_date.isoformat() if op_date else raw_date, time, cost, description, category, bank, cost > 0]
+            for tx_id, op_date, raw_date, time, cost, description, category, bank in batch
+        ]
+        if cursor is None:
+            return
+
+
+def export_ndjson(condition):
+    for batch in _export_batches(condition):
+        yield "".join(json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False) + "\n" for row in batch)
+
+
+def export_csv(condition):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for batch in _export_batches(condition):
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Заголовок без строк — у пользователя ещё нет операций
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+EXPORTERS = {
+    "ndjson": export_ndjson,
+    "csv": export_csv,
+}
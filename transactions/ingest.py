@@ -0,0 +1,408 @@
+import hashlib
+import io
+import logging
+import os
+import tempfile
+from collections import Counter, deque
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from datetime import datetime, date
+
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from config import MAX_UPLOAD_BYTES, UPLOAD_CHUNK_BYTES, PARSE_CHUNK_PAGES, INGEST_BATCH_ROWS
+from database import engine, bump_data_version, Transaction as DBTransaction, Statement as DBStatement
+from analytics.rollup import add_to_rollup
+from transactions.pool import parse_pool
+from transactions.rules import get_user_rules, apply_user_rules, merchant_key
+from transactions.utils import (
+    BANK_NAMES, PARSERS, probe_statement, extract_page_range, split_page_ranges, traced
+)
+
+logger = logging.getLogger(__name__)
+
+# SQLite ограничивает число параметров в одном запросе, поэтому IN (...) режем на куски
+LOOKUP_CHUNK = 500
+
+PARSE_CRASHED = "Процесс разбора PDF аварийно завершился. Попробуйте загрузить выписку ещё раз."
+
+async def read_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> tuple[bytes, str]:
+    """
+    Читает загрузку кусками в память с ограничением размера и по ходу считает SHA-256.
+    Файл никогда не копируется на диск под клиентским именем.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(413, f"Файл больше {max_bytes // (1024 * 1024)} МБ")
+
+    buf = io.BytesIO()
+    digest = hashlib.sha256()
+    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+        if buf.tell() + len(chunk) > max_bytes:
+            raise HTTPException(413, f"Файл больше {max_bytes // (1024 * 1024)} МБ")
+        buf.write(chunk)
+        digest.update(chunk)
+    return buf.getvalue(), digest.hexdigest()
+
+
+def ensure_not_uploaded(session: Session, user_email: str, content_hash: str):
+    """Тот же PDF уже загружался этим пользователем — отвечаем сразу, без разбора."""
+    existing = session.exec(
+        select(DBStatement.id).where(
+            (DBStatement.user_email == user_email) &
+            (DBStatement.content_hash == content_hash)
+        )
+    ).first()
+    if existing is not None:
+        raise HTTPException(400, detail="Такая выписка уже загружена.")
+
+
+def log_parse_memory(user_email: str, size: int, report: dict):
+    if report.get("peak_memory") is not None:
+        logger.info(
+            "statement parse: user=%s size=%d pages=%d rows=%d peak_memory=%d",
+            user_email, size, report["pages"], report["rows_parsed"], report["peak_memory"],
+        )
+
+
+def parse_op_date(value: str) -> date | None:
+    """Дата операции из выписки: Т-Банк пишет dd.mm.yyyy, Сбер — yyyy-mm-dd."""
+    for fmt in ("%d.%m.%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def canonical_bank(bank: str) -> str:
+    bank = bank.lower()
+    return BANK_NAMES.get(bank, bank)
+
+
+def transaction_fingerprint(user_email: str, bank: str, date: str, cost: float,
+                            description: str, occurrence: int) -> str:
+    """
+    Отпечаток операции для дедупликации.
+    occurrence — порядковый номер одинаковой операции (дата, сумма, описание) внутри выписки,
+    чтобы реальные повторы в один день не схлопывались в одну запись.
+    """
+    key = "\x1f".join([
+        user_email,
+        canonical_bank(bank),
+        date,
+        f"{cost:.2f}",
+        description,
+        str(occurrence),
+    ])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def fingerprint_transactions(user_email: str, bank: str, txs: list[dict], seen: Counter | None = None) -> Counter:
+    """Проставляет tx["fingerprint"] каждой операции. Возвращает счётчик повторов для следующих пачек."""
+    seen = Counter() if seen is None else seen
+    for tx in txs:
+        key = (tx["date"], round(tx["amount"], 2), tx["description"])
+        tx["fingerprint"] = transaction_fingerprint(
+            user_email, bank, tx["date"], tx["amount"], tx["description"], seen[key]
+        )
+        seen[key] += 1
+    return seen
+
+
+def find_existing_fingerprints(session: Session, fingerprints: list[str]) -> set[str]:
+    """Один индексный запрос (на кусок из LOOKUP_CHUNK) вместо SELECT на каждую операцию."""
+    found = set()
+    for i in range(0, len(fingerprints), LOOKUP_CHUNK):
+        chunk = fingerprints[i:i + LOOKUP_CHUNK]
+        found.update(session.exec(
+            select(DBTransaction.fingerprint).where(DBTransaction.fingerprint.in_(chunk))
+        ).all())
+    return found
+
+
+def insert_transactions(session: Session, user_email: str, bank: str, statement_id: int, txs: list[dict]) -> int:
+    """
+    Пакетная вставка одним executemany.
+    Уникальный индекс по fingerprint + ON CONFLICT DO NOTHING защищают от двойной вставки
+    при параллельной загрузке одной и той же выписки.
+    """
+    if not txs:
+        return 0
+
+    now = datetime.utcnow()
+    rows = [{
+        "date": tx["date"],
+        "op_date": parse_op_date(tx["date"]),
+        "time": tx.get("time"),
+        "cost": tx["amount"],
+        "description": tx["description"],
+        "category": tx["category"],
+        "bank": bank,
+        "created_at": now,
+        "user_email": user_email,
+        "statement_id": statement_id,
+        "fingerprint": tx["fingerprint"],
+        "merchant": tx.get("merchant") or merchant_key(tx["description"]),
+    } for tx in txs]
+
+    stmt = sqlite_insert(DBTransaction.__table__).on_conflict_do_nothing(index_elements=["fingerprint"])
+    result = session.connection().execute(stmt, rows)
+    return result.rowcount
+
+
+class StatementWriter:
+    """
+    Пишет операции одной выписки пачками по мере разбора.
+    Запись Statement создаётся при первой пачке; каждая пачка — отдельная транзакция БД,
+    чтобы долгий разбор не держал блокировку SQLite.
+    on_open(statement_id) вызывается сразу после коммита Statement.
+    """
+
+    def __init__(self, session: Session, user_email: str, bank: str, content_hash: str | None = None,
+                 on_open=None):
+        self.session = session
+        self.user_email = user_email
+        self.bank = bank
+        self.content_hash = content_hash
+        self.on_open = on_open
+        self.statement_id = None
+        self.existing_statement = False
+        self.rows = 0
+        self.inserted = 0
+        self.last_id = 0  # id последней записанной операции выписки: всё, что выше, — текущая пачка
+        self.seen = Counter()
+        # Правила пользователя читаем один раз на выписку
+        self.rules = get_user_rules(session, user_email)
+
+    def _open(self, start: str, end: str):
+        if not start or not end:
+            raise HTTPException(400, detail="Не удалось определить период выписки. Проверь формат PDF.")
+
+        try:
+            start_date = datetime.strptime(start, "%d.%m.%Y").date()
+            end_date = datetime.strptime(end, "%d.%m.%Y").date()
+        except ValueError:
+            raise HTTPException(400, detail="Некорректный формат даты в выписке.")
+
+        # --- Проверка: уже есть выписка с этим периодом?
+        self.existing_statement = self.session.exec(
+            select(DBStatement.id).where(
+                (DBStatement.user_email == self.user_email) &
+                (DBStatement.bank == self.bank) &
+                (DBStatement.date_start == start_date) &
+                (DBStatement.date_end == end_date)
+            )
+        ).first() is not None
+
+        # --- Создание новой записи о выписке
+        statement = DBStatement(
+            user_email=self.user_email,
+            bank=self.bank,
+            date_start=start_date,
+            date_end=end_date,
+            content_hash=self.content_hash
+        )
+        self.session.add(statement)
+        # Новая выписка видна в /statements даже до первых операций
+        bump_data_version(self.session, self.user_email)
+        try:
+            self.session.commit()
+        except IntegrityError:
+            # Параллельная загрузка того же файла успела раньше
+            self.session.rollback()
+            raise HTTPException(400, detail="Такая выписка уже загружена.")
+        self.statement_id = statement.id
+        if self.on_open:
+            # Statement с content_hash уже в БД: задача должна знать его id до первой пачки,
+            # иначе после обрыва выписку-сироту не убрать и повтор упрётся в ensure_not_uploaded
+            self.on_open(self.statement_id)
+
+    def write(self, start: str, end: str, txs: list[dict]):
+        if not txs:
+            return
+        if self.statement_id is None:
+            self._open(start, end)
+
+        # Отпечаток — по сумме из выписки, до того как правило пользователя поменяет её знак
+        fingerprint_transactions(self.user_email, self.bank, txs, self.seen)
+        apply_user_rules(self.rules, txs)
+        known = find_existing_fingerprints(self.session, [tx["fingerprint"] for tx in txs])
+        new_txs = [tx for tx in txs if tx["fingerprint"] not in known]
+
+        inserted = insert_transactions(self.session, self.user_email, self.bank, self.statement_id, new_txs)
+        if inserted:
+            # Итоги по месяцам — в той же транзакции, что и сама пачка
+            batch = (DBTransaction.statement_id == self.statement_id) & (DBTransaction.id > self.last_id)
+            add_to_rollup(self.session, batch)
+            self.last_id = self.session.exec(
+                select(func.max(DBTransaction.id)).where(DBTransaction.statement_id == self.statement_id)
+            ).one()
+            bump_data_version(self.session, self.user_email)
+        self.inserted += inserted
+        self.rows += len(txs)
+        self.session.commit()
+
+    def finish(self):
+        """Возвращает (statement_id, вставлено, дубликатов)."""
+        if self.statement_id is not None and self.existing_statement and self.inserted == 0:
+            # Та же выписка, все операции уже есть — как и раньше, отказываем
+            self.abort()
+            raise HTTPException(400, detail="Такая выписка уже загружена.")
+        return self.statement_id, self.inserted, self.rows - self.inserted
+
+    def abort(self):
+        """Откатывает уже записанные пачки, если разбор упал на середине."""
+        self.session.rollback()
+        if self.statement_id is None:
+            return
+        discard_statement(self.session, self.statement_id)
+        self.statement_id = None
+
+
+def discard_statement(session: Session, statement_id: int):
+    """Удаляет выписку вместе с её операциями и вычитает их из итогов по месяцам."""
+    statement = session.get(DBStatement, statement_id)
+    if statement is not None:
+        bump_data_version(session, statement.user_email)
+    add_to_rollup(session, DBTransaction.statement_id == statement_id, sign=-1)
+    session.exec(delete(DBTransaction).where(DBTransaction.statement_id == statement_id))
+    session.exec(delete(DBStatement).where(DBStatement.id == statement_id))
+    session.commit()
+
+
+@contextmanager
+def statement_file(data: bytes):
+    """
+    PDF во временном файле со случайным именем, на время разбора. Процессам пула уходит
+    только путь: иначе каждый кусок страниц тащил бы через IPC свою копию всего документа.
+    """
+    fd, path = tempfile.mkstemp(prefix="statement-", suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        yield path
+    finally:
+        os.remove(path)
+
+
+def iter_statement_pages(path: str, first_pages: list[str], page_count: int, peaks: list, on_pages=None):
+    """
+    Страницы по порядку. Первые уже извлечены при определении банка, остальные извлекаются
+    в пуле кусками по PARSE_CHUNK_PAGES. В работе держим не больше workers + 1 кусков,
+    так что в памяти одновременно лишь несколько кусков текста, а не весь документ.
+    """
+    done = len(first_pages)
+    yield from first_pages
+    if on_pages:
+        on_pages(done, page_count)
+
+    ranges = iter(split_page_ranges(done, page_count, PARSE_CHUNK_PAGES))
+    window = deque()
+    executor = parse_pool.executor
+    try:
+        while True:
+            while len(window) <= parse_pool.workers:
+                page_range = next(ranges, None)
+                if page_range is None:
+                    break
+                window.append(executor.submit(traced, extract_page_range, path, *page_range))
+            if not window:
+                return
+
+            try:
+                texts, peak = window.popleft().result()
+            except BrokenProcessPool:
+                parse_pool.reset(executor)
+                raise HTTPException(500, detail=PARSE_CRASHED)
+            peaks.append(peak)
+            done += len(texts)
+            yield from texts
+            if on_pages:
+                on_pages(done, page_count)
+    finally:
+        for future in window:
+            future.cancel()
+
+
+def ingest_pdf(data: bytes, user_email: str, bank: str | None = None, content_hash: str | None = None,
+               on_progress=None) -> dict:
+    """
+    Полный конвейер загрузки: страницы -> строки -> операции -> пачки в БД.
+    Выполняется в потоке; тяжёлое извлечение текста уходит в пул процессов.
+    on_progress(**поля) получает pages_total, pages_parsed, statement_id, rows_parsed, inserted, duplicates.
+    """
+    progress = on_progress or (lambda **fields: None)
+    with statement_file(data) as path:
+        return _ingest_file(path, user_email, bank, content_hash, progress)
+
+
+def _ingest_file(path: str, user_email: str, bank: str | None, content_hash: str | None, progress) -> dict:
+    executor = parse_pool.executor
+    try:
+        (detected, first_pages, page_count), peak = executor.submit(
+            traced, probe_statement, path, bank, PARSE_CHUNK_PAGES
+        ).result()
+    except BrokenProcessPool:
+        # Упавший процесс ломает весь пул: пересоздаём его, иначе не пройдёт ни одна загрузка
+        parse_pool.reset(executor)
+        raise HTTPException(500, detail=PARSE_CRASHED)
+    peaks = [peak]
+    # В БД — каноническое имя ('tbank', 'sber'), а не написание клиента: иначе 'tinkoff' и 'tbank'
+    # расходятся в выписках, фильтрах и проверке периода
+    bank = detected
+    parser = PARSERS[detected]()
+
+    pages = iter_statement_pages(
+        path, first_pages, page_count, peaks,
+        on_pages=lambda done, total: progress(pages_parsed=done, pages_total=total)
+    )
+
+    with Session(engine) as session:
+        writer = StatementWriter(
+            session, user_email, bank, content_hash,
+            on_open=lambda statement_id: progress(statement_id=statement_id)
+        )
+        try:
+            batch = []
+            for tx in parser.transactions(pages):
+                batch.append(tx)
+                # До того как найден период, копим операции: Statement без периода не создать
+                if len(batch) >= INGEST_BATCH_ROWS and parser.period_final:
+                    writer.write(parser.start, parser.end, batch)
+                    batch = []
+                    progress(
+                        statement_id=writer.statement_id,
+                        rows_parsed=writer.rows,
+                        inserted=writer.inserted,
+                        duplicates=writer.rows - writer.inserted
+                    )
+            writer.write(parser.start, parser.end, batch)
+            statement_id, inserted, duplicates = writer.finish()
+        except BaseException:
+            writer.abort()
+            raise
+
+    progress(statement_id=statement_id, rows_parsed=writer.rows, inserted=inserted, duplicates=duplicates)
+    return {
+        "bank": bank,
+        "start": parser.start,
+        "end": parser.end,
+        "statement_id": statement_id,
+        "pages": page_count,
+        "rows_parsed": writer.rows,
+        "inserted": inserted,
+        "duplicates": duplicates,
+        "peak_memory": None if peaks[0] is None else max(peaks),
+    }
+
+
+async def ingest_upload(data: bytes, user_email: str, bank: str | None = None, content_hash: str | None = None,
+                        on_progress=None) -> dict:
+    """Допуск через ParsePool (503 при перегрузке), затем ingest_pdf в отдельном потоке."""
+    async with parse_pool.slot():
+        return await run_in_threadpool(ingest_pdf, data, user_email, bank, content_hash, on_progress)
@@ -0,0 +1,201 @@
+import asyncio
+import traceback
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import update, or_, and_
+from sqlmodel import Session, select
+
+from config import JOB_STALE_AFTER
+from database import engine, IngestJob
+from transactions.ingest import ingest_upload, discard_statement, log_parse_memory
+from transactions.pool import parse_pool
+
+FINISHED = {"done", "failed"}
+# Как часто живая задача обновляет updated_at, в том числе пока ждёт места в пуле разбора:
+# устаревшей (JOB_STALE_AFTER) считается только задача умершего процесса
+JOB_HEARTBEAT = JOB_STALE_AFTER / 3
+
+# Ссылки на запущенные задачи, чтобы их не собрал GC
+_running: set[asyncio.Task] = set()
+# Задачи, которые сейчас выполняет этот процесс
+_claimed: set[str] = set()
+
+
+def create_job(user_email: str, bank: str | None, filename: str, payload: bytes, content_hash: str | None = None) -> IngestJob:
+    with Session(engine) as session:
+        job = IngestJob(
+            user_email=user_email, bank=bank, filename=filename,
+            payload=payload, content_hash=content_hash
+        )
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        return job
+
+
+def get_job(job_id: str, user_email: str) -> IngestJob:
+    with Session(engine) as session:
+        job = session.get(IngestJob, job_id)
+    if not job or job.user_email != user_email:
+        raise HTTPException(404, "Задача не найдена")
+    return job
+
+
+def job_to_dict(job: IngestJob) -> dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "progress": {
+            "pages_total": job.pages_total,
+            "pages_parsed": job.pages_parsed,
+            "rows_parsed": job.rows_parsed,
+            "inserted": job.inserted,
+            "duplicates": job.duplicates,
+        },
+        "statement_id": job.statement_id,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "updated_at": job.updated_at.isoformat(),
+    }
+
+
+def update_job(job_id: str, **fields):
+    fields["updated_at"] = datetime.utcnow()
+    with Session(engine) as session:
+        session.exec(update(IngestJob).where(IngestJob.id == job_id).values(**fields))
+        session.commit()
+
+
+def claim_job(job_id: str) -> bool:
+    """
+    Атомарно забирает задачу в работу. Несколько воркеров uvicorn при старте
+    пытаются подхватить одни и те же задачи — выполнит только тот, чей UPDATE сработал.
+    """
+    stale = datetime.utcnow() - timedelta(seconds=JOB_STALE_AFTER)
+    with Session(engine) as session:
+        result = session.exec(
+            update(IngestJob)
+            .where(
+                (IngestJob.id == job_id) &
+                or_(
+                    IngestJob.status == "pending",
+                    and_(IngestJob.status == "running", IngestJob.updated_at < stale),
+                )
+            )
+            .values(status="running", updated_at=datetime.utcnow())
+        )
+        session.commit()
+        return result.rowcount == 1
+
+
+def _job_finished(job_id: str) -> bool:
+    with Session(engine) as session:
+        job = session.get(IngestJob, job_id)
+    return not job or job.status in FINISHED
+
+
+async def run_job(job_id: str, wait_stale: bool = False):
+    # Вся работа с SQLite здесь и в _execute — в пуле потоков: синхронная сессия,
+    # ждущая блокировку БД, иначе остановила бы цикл событий всего воркера
+    while not await run_in_threadpool(claim_job, job_id):
+        if not wait_stale:
+            return
+        # Задачу держит другой воркер (или держал упавший) — ждём, пока она не устареет
+        if await run_in_threadpool(_job_finished, job_id):
+            return
+        await asyncio.sleep(JOB_STALE_AFTER)
+
+    _claimed.add(job_id)
+    heartbeat = asyncio.create_task(_heartbeat(job_id))
+    try:
+        await _execute(job_id)
+    finally:
+        heartbeat.cancel()
+        _claimed.discard(job_id)
+
+
+async def _heartbeat(job_id: str):
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT)
+        await run_in_threadpool(update_job, job_id)
+
+
+def _prepare_job(job_id: str) -> tuple[str, str | None, bytes, str | None]:
+    """Входные данные задачи: (email, банк, PDF, хэш). Остатки прерванного запуска удаляются."""
+    with Session(engine) as session:
+        job = session.get(IngestJob, job_id)
+        if job.statement_id is not None:
+            # Прошлый запуск прервался на середине — убираем записанные им пачки и начинаем заново
+            discard_statement(session, job.statement_id)
+            update_job(job_id, statement_id=None, rows_parsed=0, inserted=0, duplicates=0)
+        return job.user_email, job.bank, job.payload, job.content_hash
+
+
+async def _execute(job_id: str):
+    user_email, bank, payload, content_hash = await run_in_threadpool(_prepare_job, job_id)
+
+    try:
+        while True:
+            try:
+                report = await ingest_upload(
+                    payload, user_email, bank, content_hash,
+                    on_progress=lambda **fields: update_job(job_id, **fields)
+                )
+                break
+            except HTTPException as e:
+                # Пул перегружен — фоновая задача не падает, а ждёт своей очереди
+                if e.status_code != 503:
+                    raise
+                await run_in_threadpool(update_job, job_id)
+                await asyncio.sleep(parse_pool.retry_after)
+
+        log_parse_memory(user_email, len(payload), report)
+        await run_in_threadpool(
+            update_job,
+            job_id,
+            status="done",
+            bank=report["bank"],
+            rows_parsed=report["rows_parsed"],
+            inserted=report["inserted"],
+            duplicates=report["duplicates"],
+            statement_id=report["statement_id"],
+            payload=None,
+        )
+
+    except HTTPException as e:
+        await run_in_threadpool(
+            update_job, job_id, status="failed", error=str(e.detail), statement_id=None, payload=None
+        )
+    except Exception as e:
+        traceback.print_exc()
+        await run_in_threadpool(update_job, job_id, status="failed", error=str(e), statement_id=None, payload=None)
+
+
+def schedule_job(job_id: str, wait_stale: bool = False):
+    task = asyncio.create_task(run_job(job_id, wait_stale=wait_stale))
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+
+
+def resume_jobs():
+    """Подхватывает задачи, не завершённые до перезапуска воркера."""
+    with Session(engine) as session:
+        job_ids = session.exec(
+            select(IngestJob.id).where(IngestJob.status.in_(["pending", "running"]))
+        ).all()
+    for job_id in job_ids:
+        schedule_job(job_id, wait_stale=True)
+
+
+def release_jobs():
+    """При штатной остановке возвращает незавершённые задачи в очередь, чтобы следующий запуск подхватил их сразу."""
+    for job_id in list(_claimed):
+        with Session(engine) as session:
+            session.exec(
+                update(IngestJob)
+                .where((IngestJob.id == job_id) & (IngestJob.status == "running"))
+                .values(status="pending", updated_at=datetime.utcnow())
+            )
+            session.commit()
@@ -0,0 +1,96 @@
+"""
+Постраничная выдача операций по ключу (op_date, id), от новых к старым.
+
+Курсор — непрозрачная строка с ключом последней отданной строки; следующая страница
+начинается строго после него, поэтому вставки и удаления между запросами не сдвигают
+страницы, а глубина листания не влияет на стоимость запроса. Порядок обслуживает индекс
+ix_transaction_user_op_date: в SQLite id (rowid) уже входит в каждый индекс последним столбцом.
+Без limit и курсора отдаётся весь список, как до постраничной выдачи.
+"""
+import base64
+from datetime import date
+
+from fastapi import HTTPException, Response
+from sqlalchemy import or_
+from sqlmodel import Session, select
+
+from config import PAGE_SIZE_DEFAULT
+from database import Transaction as DBTransaction
+from transactions.ingest import canonical_bank
+
+
+def encode_cursor(tx: DBTransaction) -> str:
+    key = f"{tx.op_date.isoformat() if tx.op_date else ''}:{tx.id}"
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[date | None, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        op_date, tx_id = raw.split(":")
+        return (date.fromisoformat(op_date) if op_date else None), int(tx_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(400, "Invalid cursor")
+
+
+def transaction_filter(user_email: str, date_from: date | None = None, date_to: date | None = None,
+                       category: str | None = None, bank: str | None = None):
+    condition = DBTransaction.user_email == user_email
+    if date_from is not None:
+        condition &= DBTransaction.op_date >= date_from
+    if date_to is not None:
+        condition &= DBTransaction.op_date <= date_to
+    if category is not None:
+        condition &= DBTransaction.category == category
+    if bank is not None:
+        # В БД банк хранится в каноническом виде (ingest и canonicalize_banks в migrations)
+        condition &= DBTransaction.bank == canonical_bank(bank)
+    return condition
+
+
+def _fetch(session: Session, columns, condition, limit: int | None) -> list:
+    return list(session.exec(
+        (select(*columns) if columns else select(DBTransaction))
+        .where(condition)
+        .order_by(DBTransaction.op_date.desc(), DBTransaction.id.desc())
+        .limit(limit)
+    ).all())
+
+
+def transaction_page(session: Session, condition, limit: int | None, cursor: str | None = None, columns=None):
+    """
+    Возвращает (строки страницы, курсор следующей страницы или None).
+    columns — выбрать только эти столбцы (кортежи вместо моделей); id и op_date нужны курсору.
+    limit=None: без курсора — все строки одним списком, с курсором — страница PAGE_SIZE_DEFAULT.
+    """
+    if limit is None:
+        if not cursor:
+            return _fetch(session, columns, condition, None), None
+        limit = PAGE_SIZE_DEFAULT
+
+    if not cursor:
+        rows = _fetch(session, columns, condition, limit + 1)
+    else:
+        op_date, tx_id = decode_cursor(cursor)
+        no_date = DBTransaction.op_date.is_(None)
+        if op_date is None:
+            rows = _fetch(session, columns, condition & no_date & (DBTransaction.id < tx_id), limit + 1)
+        else:
+            # Диапазон по op_date, чтобы индекс начинал сразу с курсора; операции без даты
+            # в диапазон не попадают — они идут хвостом после всех датированных
+            rows = _fetch(session, columns, condition & (DBTransaction.op_date <= op_date) & or_(
+                DBTransaction.op_date < op_date, DBTransaction.id < tx_id
+            ), limit + 1)
+            if len(rows) <= limit:
+                rows += _fetch(session, columns, condition & no_date, limit + 1 - len(rows))
+
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1])
+
+
+def set_page_headers(response: Response, next_cursor: str | None):
+    response.headers["X-Has-More"] = "true" if next_cursor else "false"
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
@@ -0,0 +1,128 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+from config import (
+    PARSE_WORKERS, PARSE_MAX_CONCURRENT, PARSE_MAX_QUEUE, PARSE_RETRY_AFTER, PARSE_PREWARM,
+    PARSE_WORKER_MAX_MEMORY_MB,
+)
+
+
+def _warm_worker():
+    # Импорт pdfplumber/pdfminer — самая долгая часть первого разбора в свежем процессе
+    import pdfplumber  # noqa: F401
+    import transactions.utils  # noqa: F401
+
+
+def _init_worker(prewarm: bool, max_memory_mb: int):
+    if max_memory_mb:
+        # Жёсткий потолок памяти процесса: «PDF-бомба» получит MemoryError, а не OOM всего сервера
+        import resource
+        limit = max_memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if prewarm:
+        _warm_worker()
+
+
+class ParsePool:
+    """
+    Пул процессов для синхронного разбора PDF, чтобы pdfplumber не блокировал event loop.
+    Одновременно выполняется не больше max_concurrent задач, ещё max_queue ждут;
+    всё сверх этого сразу получает 503 с Retry-After.
+    """
+
+    def __init__(self, workers: int, max_concurrent: int, max_queue: int, retry_after: int, prewarm: bool):
+        self.workers = workers
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.prewarm = prewarm
+        self._executor: ProcessPoolExecutor | None = None
+        self._executor_lock = threading.Lock()  # executor берут и сбрасывают из потоков разбора
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._in_flight = 0
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.prewarm, PARSE_WORKER_MAX_MEMORY_MB),
+                )
+            return self._executor
+
+    def reset(self, executor: ProcessPoolExecutor):
+        """
+        Процесс пула умер (segfault, OOM killer, потолок памяти) — такой executor навсегда
+        отвечает BrokenProcessPool. Гасим его; следующее обращение к executor поднимет новый.
+        """
+        with self._executor_lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def start(self):
+        if not self.prewarm:
+            return
+        # ProcessPoolExecutor поднимает процессы лениво — форсируем их запуск
+        futures = [self.executor.submit(_warm_worker) for _ in range(self.workers)]
+        for f in futures:
+            f.result()
+
+    def shutdown(self):
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "in_flight": self._in_flight,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+        }
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Допуск одного разбора. Внутри слота можно отправить в пул несколько задач
+        (например, куски страниц одной выписки) через submit().
+        """
+        if self._in_flight >= self.max_concurrent + self.max_queue:
+            raise HTTPException(
+                503,
+                detail="Сервер перегружен разбором выписок, попробуйте позже.",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+
+        self._in_flight += 1
+        try:
+            async with self._semaphore:
+                yield self
+        finally:
+            self._in_flight -= 1
+
+    async def submit(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+    async def run(self, fn, *args):
+        async with self.slot():
+            return await self.submit(fn, *args)
+
+
+parse_pool = ParsePool(
+    workers=PARSE_WORKERS,
+    max_concurrent=PARSE_MAX_CONCURRENT,
+    max_queue=PARSE_MAX_QUEUE,
+    retry_after=PARSE_RETRY_AFTER,
+    prewarm=PARSE_PREWARM,
+)
@@ -1,143 +1,143 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Request, Header, Path
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Request, Response, Header, Path, Query
 from sqlmodel import Session, select
-from database import Transaction as DBTransaction, Statement as DBStatement
-from transactions.utils import parse_statement, categorize_sber, categorize_tbank
+from database import Transaction as DBTransaction
+from transactions.ingest import read_upload, ensure_not_uploaded, ingest_upload, log_parse_memory
+from transactions.jobs import FINISHED, create_job, get_job, job_to_dict, schedule_job
+from transactions.paging import transaction_filter, transaction_page, set_page_headers
+from transactions.export import EXPORTERS, MEDIA_TYPES
+from responses import fast_json_enabled, json_rows
+from transactions.rules import learn_rule, apply_rule, invalidate_user_rules, signed_cost, merchant_key, recategorize
+from analytics.rollup import add_to_rollup
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from config import JOB_POLL_INTERVAL, PAGE_SIZE_MAX
 from auth.utils import decode_token
 from datetime import datetime
-import os, traceback
-from database import engine
+import traceback, json, asyncio
+from database import engine, bump_data_version
+from cache import not_modified
 from fastapi import Depends
 from typing import List
 from sqlmodel import Session, select
 from auth.utils import get_current_user
-from database import get_session, Transaction as DBTransaction
+from database import get_session, Transaction as DBTransaction, CategoryRule
 from pydantic import BaseModel
 from datetime import date
 
 
 router = APIRouter()
 
+# Поля операции в ответе /transactions/. Служебные fingerprint и merchant наружу не отдаём;
+# op_date выбирается последним только для курсора и в ответ не попадает
+TRANSACTION_FIELDS = ["id", "date", "time", "cost", "description", "category", "bank",
+                      "created_at", "user_email", "statement_id"]
+TRANSACTION_COLUMNS = [DBTransaction.__table__.c[name] for name in TRANSACTION_FIELDS] + [DBTransaction.op_date]
+
 @router.get("/")
-def get_transactions(authorization: str = Header(...)):
+def get_transactions(
+    request: Request,
+    response: Response,
+    authorization: str = Header(...),
+    limit: int | None = Query(None, ge=1, le=PAGE_SIZE_MAX),
+    cursor: str | None = Query(None),
+    date_from: date | None = Query(None),
+    date_to: date | None = Query(None),
+    category: str | None = Query(None),
+    bank: str | None = Query(None)
+):
     user_email = decode_token(authorization.split(" ")[1])
     with Session(engine) as session:
-        return session.exec(select(DBTransaction).where(DBTransaction.user_email == user_email)).all()
+        unchanged = not_modified(request, response, session, user_email, "transactions", dict(request.query_params))
+        if unchanged is not None:
+            return unchanged
+        condition = transaction_filter(user_email, date_from, date_to, category, bank)
+        rows, next_cursor = transaction_page(session, condition, limit, cursor, TRANSACTION_COLUMNS)
+    set_page_headers(response, next_cursor)
+    transactions = [dict(zip(TRANSACTION_FIELDS, row)) for row in rows]
+    if fast_json_enabled():
+        return json_rows(transactions, response)
+    return transactions
+
+
+@router.get("/export")
+def export_transactions(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    date_from: date | None = Query(None),
+    date_to: date | None = Query(None),
+    category: str | None = Query(None),
+    bank: str | None = Query(None),
+    user: dict = Depends(get_current_user)
+):
+    condition = transaction_filter(user["email"], date_from, date_to, category, bank)
+    return StreamingResponse(
+        EXPORTERS[format](condition),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="transactions.{format}"'}
+    )
+
+
+def check_not_uploaded(user_email: str, content_hash: str):
+    with Session(engine) as session:
+        ensure_not_uploaded(session, user_email, content_hash)
+
+
+def statement_transactions(statement_id: int) -> list[dict]:
+    with Session(engine) as session:
+        inserted_transactions = session.exec(
+            select(DBTransaction)
+            .where(DBTransaction.statement_id == statement_id)
+            .order_by(DBTransaction.id)
+        ).all()
+
+        return [{
+            "id": tx.id,
+            "date": tx.date,
+            "time": tx.time,
+            "amount": tx.cost,
+            "isIncome": tx.cost > 0,
+            "description": tx.description,
+            "category": tx.category,
+            "bank": tx.bank
+        } for tx in inserted_transactions]
 
 
 @router.post("/upload")
 async def upload_statement(
     request: Request,
     file: UploadFile = File(...),
-    bank: str = Form(...)
+    bank: str | None = Form(None),
+    async_mode: bool = Form(False)
 ):
     if not file.filename.endswith(".pdf"):
         raise HTTPException(400, "Only PDF files are supported")
 
     user_email = decode_token(request.headers.get("authorization").split(" ")[1])
-    contents = await file.read()
-    temp_path = f"/tmp/{file.filename}"
-
-    with open(temp_path, 'wb') as f:
-        f.write(contents)
+    contents, content_hash = await read_upload(file)
+
+    # Работа с SQLite — в пуле потоков, чтобы не держать цикл событий на блокировке БД
+    await run_in_threadpool(check_not_uploaded, user_email, content_hash)
+
+    # --- Фоновый режим: сразу отдаём id задачи, разбор идёт в фоне
+    if async_mode:
+        job = await run_in_threadpool(create_job, user_email, bank, file.filename, contents, content_hash)
+        schedule_job(job.id)
+        return JSONResponse(status_code=202, content={
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/transactions/upload/{job.id}",
+            "events_url": f"/transactions/upload/{job.id}/events"
+        })
 
     try:
-        start, end, txs = parse_statement(temp_path, bank)
-        if not txs:
-            return {"period": {"start": start, "end": end}, "transactions": []}
-
-        with Session(engine) as session:
-            if not start or not end:
-                raise HTTPException(400, detail="Не удалось определить период выписки. Проверь формат PDF.")
-
-            try:
-                start_date = datetime.strptime(start, "%d.%m.%Y").date()
-                end_date = datetime.strptime(end, "%d.%m.%Y").date()
-            except ValueError:
-                raise HTTPException(400, detail="Некорректный формат даты в выписке.")
-
-            # --- Проверка: уже есть выписка с этим периодом?
-            existing_statement = session.exec(
-                select(DBStatement).where(
-                    (DBStatement.user_email == user_email) &
-                    (DBStatement.bank == bank) &
-                    (DBStatement.date_start == start_date) &
-                    (DBStatement.date_end == end_date)
-                )
-            ).first()
-
-            if existing_statement:
-                duplicate_count = 0
-                for tx in txs:
-                    exists = session.exec(
-                        select(DBTransaction).where(
-                            (DBTransaction.user_email == user_email) &
-                            (DBTransaction.date == tx["date"]) &
-                            (DBTransaction.cost == tx["amount"]) &
-                            (DBTransaction.description == tx["description"]) &
-                            (DBTransaction.bank == bank)
-                        )
-                    ).first()
-                    if exists:
-                        duplicate_count += 1
-
-                if duplicate_count == len(txs):
-                    raise HTTPException(400, detail="Такая выписка уже загружена.")
-
-            # --- Создание новой записи о выписке
-            statement = DBStatement(
-                user_email=user_email,
-                bank=bank,
-                date_start=start_date,
-                date_end=end_date
-            )
-            session.add(statement)
-            session.commit()
-            session.refresh(statement)
-
-            inserted_transactions = []
-            for tx in txs:
-                exists = session.exec(
-                    select(DBTransaction).where(
-                        (DBTransaction.user_email == user_email) &
-                        (DBTransaction.date == tx["date"]) &
-                        (DBTransaction.cost == tx["amount"]) &
-                        (DBTransaction.description == tx["description"]) &
-                        (DBTransaction.bank == bank)
-                    )
-                ).first()
-
-                if exists:
-                    continue
-
-                tx_obj = DBTransaction(
-                    date=tx["date"],
-                    time=tx.get("time"),
-                    cost=tx["amount"],
-                    description=tx["description"],
-                    category=tx["category"],
-                    bank=bank,
-                    user_email=user_email,
-                    statement_id=statement.id
-                )
-                session.add(tx_obj)
-                inserted_transactions.append(tx_obj)
-
-            session.commit()
-
-            response_transactions = [{
-                "id": tx.id,
-                "date": tx.date,
-                "time": tx.time,
-                "amount": tx.cost,
-                "isIncome": tx.cost > 0,
-                "description": tx.description,
-                "category": tx.category,
-                "bank": tx.bank
-            } for tx in inserted_transactions]
+        report = await ingest_upload(contents, user_email, bank, content_hash)
+        log_parse_memory(user_email, len(contents), report)
+        period = {"start": report["start"], "end": report["end"]}
+        if report["statement_id"] is None:
+            return {"period": period, "transactions": []}
 
         return {
-            "period": {"start": start, "end": end},
-            "transactions": response_transactions
+            "period": period,
+            "transactions": await run_in_threadpool(statement_transactions, report["statement_id"])
         }
 
     except HTTPException:
@@ -145,8 +145,31 @@ async def upload_statement(
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(500, str(e))
-    finally:
-        os.remove(temp_path)
+
+
+@router.get("/upload/{job_id}")
+def get_upload_job(job_id: str, user: dict = Depends(get_current_user)):
+    return job_to_dict(get_job(job_id, user["email"]))
+
+
+@router.get("/upload/{job_id}/events")
+async def upload_job_events(job_id: str, user: dict = Depends(get_current_user)):
+    # Чтение задачи — синхронная сессия SQLite: в пуле потоков, чтобы не блокировать цикл событий
+    await run_in_threadpool(get_job, job_id, user["email"])
+
+    async def stream():
+        last = None
+        while True:
+            state = job_to_dict(await run_in_threadpool(get_job, job_id, user["email"]))
+            if state != last:
+                event = "done" if state["status"] in FINISHED else "progress"
+                yield f"event: {event}\ndata: {json.dumps(state, ensure_ascii=False)}\n\n"
+                last = state
+            if state["status"] in FINISHED:
+                return
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 
 @router.patch("/{transaction_id}")
@@ -167,20 +190,89 @@ def update_transaction_category(
         if tx.user_email != user_email:
             raise HTTPException(403, "Forbidden")
 
+        # ✅ Итоги по месяцам: убираем строку в старом виде, после изменения добавляем в новом
+        add_to_rollup(session, DBTransaction.id == tx.id, sign=-1)
+
         # ✅ Обновляем категорию
         tx.category = new_category
 
-        # ✅ Автообработка суммы при смене категории
-        if new_category == "Пополнение" and tx.cost < 0:
-            tx.cost = abs(tx.cost)
-        # ❗️(Опционально) для прочих категорий — делаем сумму отрицательной, если она положительная
-        elif new_category != "Пополнение" and tx.cost > 0:
-            tx.cost = -abs(tx.cost)
+        # ✅ Автообработка суммы при смене категории: пополнение — плюс, остальное — минус
+        tx.cost = signed_cost(new_category, tx.cost)
 
         session.add(tx)
+        session.flush()
+        add_to_rollup(session, DBTransaction.id == tx.id)
+        bump_data_version(session, user_email)
+
+        # ✅ Запоминаем исправление как правило для продавца. К уже загруженным операциям — только
+        # по явному apply_to_existing: у Сбера описание — это категория банка, и правило задело бы
+        # (и перевернуло знак) у множества чужих операций
+        rule = learn_rule(session, user_email, tx.description, new_category)
+        rule_id = rule.id if rule else None
+        updated = 1
+        if rule is not None and category_update.get("apply_to_existing", False):
+            updated += apply_rule(session, rule)
+        session.commit()
+
+    return {
+        "msg": "Category and amount updated accordingly",
+        "rule_id": rule_id,
+        "updated": updated
+    }
+
+
+class BulkRecategorize(BaseModel):
+    category: str
+    ids: List[int] | None = None
+    description: str | None = None  # подстрока описания
+    merchant: str | None = None      # продавец, сравнивается по нормализованному ключу, как в правилах
+
+
+@router.post("/recategorize")
+def bulk_recategorize(data: BulkRecategorize, user: dict = Depends(get_current_user)):
+    """Меняет категорию сразу у всех подходящих операций пользователя одним UPDATE; фильтры складываются по И."""
+    if not data.category:
+        raise HTTPException(400, "Category required")
+    if not data.ids and not data.description and not data.merchant:
+        raise HTTPException(400, "ids, description or merchant required")
+
+    condition = DBTransaction.user_email == user["email"]
+    if data.ids:
+        condition &= DBTransaction.id.in_(data.ids)
+    if data.description:
+        condition &= DBTransaction.description.contains(data.description, autoescape=True)
+    if data.merchant:
+        condition &= DBTransaction.merchant == merchant_key(data.merchant)
+
+    with Session(engine) as session:
+        updated = recategorize(session, condition, data.category)
+        if updated:
+            bump_data_version(session, user["email"])
         session.commit()
 
-    return {"msg": "Category and amount updated accordingly"}
+    return {"msg": "Category and amount updated accordingly", "updated": updated}
+
+
+@router.get("/rules")
+def get_category_rules(user: dict = Depends(get_current_user)):
+    with Session(engine) as session:
+        return session.exec(
+            select(CategoryRule)
+            .where(CategoryRule.user_email == user["email"])
+            .order_by(CategoryRule.updated_at.desc())
+        ).all()
+
+
+@router.delete("/rules/{rule_id}")
+def delete_category_rule(rule_id: int = Path(...), user: dict = Depends(get_current_user)):
+    with Session(engine) as session:
+        rule = session.get(CategoryRule, rule_id)
+        if not rule or rule.user_email != user["email"]:
+            raise HTTPException(404, "Rule not found")
+        session.delete(rule)
+        session.commit()
+    invalidate_user_rules(user["email"])
+    return {"msg": "Rule deleted"}
 
 class TransactionOut(BaseModel):
     id: int
@@ -191,6 +283,12 @@ class TransactionOut(BaseModel):
     bank: str
     isIncome: bool
 
+HISTORY_COLUMNS = [
+    DBTransaction.id, DBTransaction.op_date, DBTransaction.date, DBTransaction.cost,
+    DBTransaction.description, DBTransaction.category, DBTransaction.bank
+]
+
+
 def parse_date(date_str: str) -> datetime.date:
     for fmt in ("%d.%m.%Y", "%Y-%m-%d"):
         try:
@@ -202,19 +300,42 @@ def parse_date(date_str: str) -> datetime.date:
 
 @router.get("/history", response_model=List[TransactionOut])
 def get_transaction_history(
+    request: Request,
+    response: Response,
+    limit: int | None = Query(None, ge=1, le=PAGE_SIZE_MAX),
+    cursor: str | None = Query(None),
+    date_from: date | None = Query(None),
+    date_to: date | None = Query(None),
+    category: str | None = Query(None),
+    bank: str | None = Query(None),
     session: Session = Depends(get_session),
     user: dict = Depends(get_current_user)
 ):
-    transactions = session.exec(
-        select(DBTransaction)
-        .where(DBTransaction.user_email == user["email"])
-        .order_by(DBTransaction.date.desc())
-    ).all()
+    unchanged = not_modified(request, response, session, user["email"], "transactions/history", dict(request.query_params))
+    if unchanged is not None:
+        return unchanged
+
+    condition = transaction_filter(user["email"], date_from, date_to, category, bank)
+    if fast_json_enabled():
+        rows, next_cursor = transaction_page(session, condition, limit, cursor, HISTORY_COLUMNS)
+        set_page_headers(response, next_cursor)
+        return json_rows([{
+            "id": tx_id,
+            "date": op_date or parse_date(raw_date),
+            "amount": cost,
+            "description": description,
+            "category": category,
+            "bank": bank,
+            "isIncome": cost > 0
+        } for tx_id, op_date, raw_date, cost, description, category, bank in rows], response)
+
+    transactions, next_cursor = transaction_page(session, condition, limit, cursor)
+    set_page_headers(response, next_cursor)
 
     return [
         TransactionOut(
             id=tx.id,
-            date=parse_date(tx.date),
+            date=tx.op_date or parse_date(tx.date),
             amount=tx.cost,
             description=tx.description,
             category=tx.category,
@@ -0,0 +1,128 @@
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import func, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+
+from config import CATEGORY_RULES_CACHE_USERS
+from database import CategoryRule, Transaction as DBTransaction
+from analytics.rollup import affected_months, refresh_months
+
+INCOME_CATEGORY = "Пополнение"
+
+# Цифры (номера карт, чеков, даты) и пунктуация в ключ продавца не входят
+MERCHANT_NOISE = re.compile(r"[\W\d_]+")
+
+# email -> (отметка версии правил, {продавец: категория}); самые давние обращения вытесняются первыми
+_matchers: OrderedDict[str, tuple[tuple, dict[str, str]]] = OrderedDict()
+_lock = threading.Lock()
+
+
+def merchant_key(description: str) -> str:
+    """«Оплата в GLOBUS *1234 Омск» и «оплата в globus омск» — один продавец."""
+    return " ".join(MERCHANT_NOISE.sub(" ", description.lower()).split())
+
+
+def signed_cost(category: str, cost: float) -> float:
+    """Знак суммы по категории, как при ручной смене категории: пополнение — плюс, остальное — минус."""
+    return abs(cost) if category == INCOME_CATEGORY else -abs(cost)
+
+
+def _rules_stamp(session: Session, user_email: str) -> tuple:
+    # Дешёвая проверка по индексу: правило добавили, изменили или удалили — отметка другая.
+    # Нужна, потому что правило могли выучить в другом воркере uvicorn.
+    return tuple(session.exec(
+        select(func.count(CategoryRule.id), func.max(CategoryRule.updated_at))
+        .where(CategoryRule.user_email == user_email)
+    ).one())
+
+
+def get_user_rules(session: Session, user_email: str) -> dict[str, str]:
+    """Правила пользователя {продавец: категория} из LRU-кэша; перечитываются, только если изменились."""
+    stamp = _rules_stamp(session, user_email)
+    with _lock:
+        cached = _matchers.get(user_email)
+        if cached is not None and cached[0] == stamp:
+            _matchers.move_to_end(user_email)
+            return cached[1]
+
+    rules = dict(session.exec(
+        select(CategoryRule.merchant, CategoryRule.category).where(CategoryRule.user_email == user_email)
+    ).all())
+
+    with _lock:
+        _matchers[user_email] = (stamp, rules)
+        _matchers.move_to_end(user_email)
+        while len(_matchers) > CATEGORY_RULES_CACHE_USERS:
+            _matchers.popitem(last=False)
+    return rules
+
+
+def invalidate_user_rules(user_email: str):
+    with _lock:
+        _matchers.pop(user_email, None)
+
+
+def apply_user_rules(rules: dict[str, str], txs: list[dict]) -> list[dict]:
+    """
+    Проставляет tx["merchant"] и перекрывает встроенную категорию правилом пользователя.
+    Знак суммы меняется так же, как при ручном исправлении.
+    """
+    for tx in txs:
+        tx["merchant"] = merchant_key(tx["description"])
+        category = rules.get(tx["merchant"])
+        if category is not None:
+            tx["category"] = category
+            tx["amount"] = signed_cost(category, tx["amount"])
+    return txs
+
+
+def learn_rule(session: Session, user_email: str, description: str, category: str) -> CategoryRule | None:
+    """Запоминает исправление как правило для продавца. Для описаний без букв правило не заводим."""
+    merchant = merchant_key(description)
+    if not merchant:
+        return None
+
+    now = datetime.utcnow()
+    session.exec(
+        sqlite_insert(CategoryRule.__table__)
+        .values(user_email=user_email, merchant=merchant, category=category, created_at=now, updated_at=now)
+        .on_conflict_do_update(
+            index_elements=["user_email", "merchant"],
+            set_={"category": category, "updated_at": now}
+        )
+    )
+    invalidate_user_rules(user_email)
+    return session.exec(
+        select(CategoryRule).where((CategoryRule.user_email == user_email) & (CategoryRule.merchant == merchant))
+    ).one()
+
+
+def recategorize(session: Session, condition, category: str) -> int:
+    """
+    Одним UPDATE переводит подходящие под condition операции в category, с тем же правилом знака.
+    Операции, уже стоящие в этой категории, не трогает. Возвращает число изменённых строк.
+    Итоги затронутых месяцев пересчитываются в той же транзакции.
+    """
+    condition &= DBTransaction.category != category
+    months = affected_months(session, condition)
+    cost = func.abs(DBTransaction.cost)
+    result = session.exec(
+        update(DBTransaction)
+        .where(condition)
+        .values(category=category, cost=cost if category == INCOME_CATEGORY else -cost)
+    )
+    refresh_months(session, months)
+    return result.rowcount
+
+
+def apply_rule(session: Session, rule: CategoryRule) -> int:
+    """Применяет правило ко всем уже загруженным операциям пользователя с этим продавцом."""
+    return recategorize(
+        session,
+        (DBTransaction.user_email == rule.user_email) & (DBTransaction.merchant == rule.merchant),
+        rule.category
+    )
@@ -1,144 +1,253 @@
-import re, pdfplumber, logging
+import re, pdfplumber, logging, io, tracemalloc
 import datetime
+from abc import ABC, abstractmethod
+
+from config import PARSE_TRACE_MEMORY
 
 logging.getLogger("pdfminer").setLevel(logging.ERROR)
 logging.getLogger("pdfplumber").setLevel(logging.ERROR)
 
+# --- ОБЩИЕ СТАДИИ РАЗБОРА ---
+# Разбор устроен как цепочка генераторов: текст страниц -> строки -> записи -> категоризированные операции.
+# Операции выходят по мере чтения страниц, поэтому память не растёт с размером выписки.
+
+def iter_lines(pages, split=str.splitlines):
+    for page in pages:
+        for line in split(page):
+            line = line.strip()
+            if line:
+                yield line
+
+def _lower_pattern(pattern: str) -> str:
+    """Литералы шаблона в нижний регистр, escape-последовательности (\\b, \\s, ...) не трогаем."""
+    return re.sub(r'\\.|[^\\]+', lambda m: m.group() if m.group().startswith('\\') else m.group().lower(), pattern)
+
+class Categorizer:
+    """
+    Категоризация описаний по упорядоченным правилам [(категория, [шаблоны]), ...]: раньше — приоритетнее.
+
+    Все шаблоны один раз собираются в общую альтернацию, по группе на правило.
+    Описание просматривается слева направо за один проход: нашли совпадение правила i —
+    дальше ищем только среди более приоритетных правил 0..i-1, начиная со следующей позиции.
+    Вместо re.IGNORECASE описание и шаблоны приводятся к нижнему регистру:
+    с флагом re не может быстро пропускать позиции по первому символу и работает в разы медленнее.
+    """
+
+    def __init__(self, rules, default: str = "Другие"):
+        rules = list(rules)
+        self.default = default
+        self.categories = [category for category, _ in rules]
+        groups = [
+            f"(?P<r{i}>{'|'.join(f'(?:{_lower_pattern(p)})' for p in patterns)})"
+            for i, (_, patterns) in enumerate(rules)
+        ]
+        # _search[k] ищет только среди первых k правил
+        self._search = [None] + [re.compile("|".join(groups[:k])).search for k in range(1, len(groups) + 1)]
+
+    def __call__(self, description: str) -> str:
+        text = description.lower()
+        best = None
+        m = self._search[-1](text) if self._search[-1] else None
+        while m is not None:
+            best = int(m.lastgroup[1:])
+            if best == 0:
+                break
+            m = self._search[best](text, m.start() + 1)
+        return self.default if best is None else self.categories[best]
+
+    def categorize(self, txs: list[dict]) -> list[dict]:
+        for tx in txs:
+            tx['category'] = self(tx['description'])
+        return txs
+
+def categorize_stream(records, categorizer):
+    for record in records:
+        record['category'] = categorizer(record['description'])
+        yield record
+
+class StatementParser(ABC):
+    """
+    Потоковый разбор выписки. start/end заполняются, как только период найден в тексте;
+    period_final — период окончательный и операции можно сохранять, не дожидаясь конца документа.
+    """
+    bank = None
+
+    def __init__(self):
+        self.start = None
+        self.end = None
+        self.period_final = False
+
+    @abstractmethod
+    def watch_period(self, pages):
+        """Пропускает страницы дальше, по пути заполняя start/end/period_final."""
+
+    @abstractmethod
+    def records(self, lines):
+        """Строки текста -> записи операций без категории."""
+
+    @abstractmethod
+    def transactions(self, pages):
+        """Страницы -> категоризированные операции."""
+
+    def parse(self, pages):
+        txs = list(self.transactions(pages))
+        return self.start, self.end, txs
+
 # --- ПАРСЕР Т-БАНКА ---
-def parse_tbank_statement(pdf_path):
-    with pdfplumber.open(pdf_path) as pdf:
-        text = "\n".join(page.extract_text() or "" for page in pdf.pages)
-
-    if not re.search(r'Т-?банк', text, re.IGNORECASE):
-        raise ValueError("❌ Файл не является выпиской Т-банка")
-
-    m = re.search(r'Движение средств за период с (\d{2}\.\d{2}\.\d{4}) по (\d{2}\.\d{2}\.\d{4})', text)
-    start, end = m.groups() if m else (None, None)
-
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-    pat1 = re.compile(r'^(\d{2}\.\d{2}\.\d{4})\s+(\d{2}\.\d{2}\.\d{4})\s+([+\-][\d\s\.,]+)\s+₽\s+([+\-][\d\s\.,]+)\s+₽\s+(.+?)\s+(\d{4})$')
-    pat2 = re.compile(r'^(\d{2}:\d{2})\s+(\d{2}:\d{2})\s+(.+)$')
-
-    footer_patterns = [
-        re.compile(r'^АО «ТБанк', re.IGNORECASE),
-        re.compile(r'^БИК', re.IGNORECASE),
-        re.compile(r'^ИНН', re.IGNORECASE),
-        re.compile(r'^Пополнения[:\s]', re.IGNORECASE),
-        re.compile(r'^Расход[:\s]', re.IGNORECASE),
-        re.compile(r'^Итого', re.IGNORECASE),
-        re.compile(r'^С уважением', re.IGNORECASE),
-    ]
-
-    txs = []
-    clean = lambda s: float(s.replace(" ", "").replace(",", "."))
-    i = 0
-    while i < len(lines) - 1:
-        m1 = pat1.match(lines[i])
-        m2 = pat2.match(lines[i + 1])
-        if m1 and m2:
+TBANK_PERIOD = re.compile(r'Движение средств за период с (\d{2}\.\d{2}\.\d{4}) по (\d{2}\.\d{2}\.\d{4})')
+TBANK_LINE = re.compile(r'^(\d{2}\.\d{2}\.\d{4})\s+(\d{2}\.\d{2}\.\d{4})\s+([+\-][\d\s\.,]+)\s+₽\s+([+\-][\d\s\.,]+)\s+₽\s+(.+?)\s+(\d{4})$')
+TBANK_TIME_LINE = re.compile(r'^(\d{2}:\d{2})\s+(\d{2}:\d{2})\s+(.+)$')
+TBANK_FOOTERS = [
+    re.compile(r'^АО «ТБанк', re.IGNORECASE),
+    re.compile(r'^БИК', re.IGNORECASE),
+    re.compile(r'^ИНН', re.IGNORECASE),
+    re.compile(r'^Пополнения[:\s]', re.IGNORECASE),
+    re.compile(r'^Расход[:\s]', re.IGNORECASE),
+    re.compile(r'^Итого', re.IGNORECASE),
+    re.compile(r'^С уважением', re.IGNORECASE),
+]
+
+class TBankStatementParser(StatementParser):
+    bank = "tbank"
+
+    def watch_period(self, pages):
+        for page in pages:
+            if not self.period_final:
+                m = TBANK_PERIOD.search(page)
+                if m:
+                    self.start, self.end = m.groups()
+                    self.period_final = True
+            yield page
+
+    def records(self, lines):
+        """
+        Операция — строка с датами и суммами, за ней строка со временем,
+        затем строки продолжения описания до следующей операции или подвала.
+        Окно в две строки, так что операция, разорванная границей страницы, собирается как раньше.
+        """
+        clean = lambda s: float(s.replace(" ", "").replace(",", "."))
+        lines = iter(lines)
+        current = next(lines, None)
+        while current is not None:
+            following = next(lines, None)
+            if following is None:
+                return
+
+            m1 = TBANK_LINE.match(current)
+            m2 = TBANK_TIME_LINE.match(following) if m1 else None
+            if not (m1 and m2):
+                current = following
+                continue
+
             date_op, _, amt_op_raw, _, desc1, _ = m1.groups()
             time_op, _, desc2 = m2.groups()
             desc = f"{desc1} {desc2}"
-            j = i + 2
-            while j < len(lines):
-                if pat1.match(lines[j]) or pat2.match(lines[j]) or any(p.search(lines[j]) for p in footer_patterns):
+
+            current = next(lines, None)
+            while current is not None:
+                if TBANK_LINE.match(current) or TBANK_TIME_LINE.match(current) or any(p.search(current) for p in TBANK_FOOTERS):
                     break
-                desc += ' ' + lines[j]
-                j += 1
+                desc += ' ' + current
+                current = next(lines, None)
+
             amount_value = clean(amt_op_raw)
             is_income = amount_value > 0
 
-            txs.append({
+            yield {
                 'date': date_op,
                 'time': time_op,
                 'amount': amount_value if is_income else -abs(amount_value),  # ✅
                 'description': desc.strip(),
                 'isIncome': is_income
-            })
-            i = j
-        else:
-            i += 1
+            }
+
+    def transactions(self, pages):
+        lines = iter_lines(self.watch_period(pages))
+        return categorize_stream(self.records(lines), TBANK_CATEGORIZER)
+
+def parse_tbank_statement(pdf_path):
+    return parse_tbank_pages(extract_statement_pages(pdf_path, "tbank")[1])
 
-    return start, end, categorize_tbank(txs)
+def parse_tbank_pages(pages):
+    return TBankStatementParser().parse(pages)
+
+TBANK_CATEGORIES = {
+    'Кофейни':            [r'кофе', r'кофейня', r'кофешоп', r'cafe', r'coffee',
+                           r'шоколадница', r'кофемания', r'Coffeemania',
+                           r'даблби', r'DBL', r'DoubleB', r'скуратов', r'skuratov',
+                           r'энитайм', r'entime', r'starbucks', r'старбакс'],
+    'Магазины':           [r'krasnoe', r'красное', r'beloye', r'белое', r'magnit', r'магнит',
+                           r'победа', r'pobeda', r'plaza', r'fixprice', r'фикс прайс',
+                           r'triumf', r'триумф', r'bufet', r'буфет', r'pek', r'пекарушка',
+                           r'prostor', r'простор', r'ozon', r'ozon\.ru', r'wildberries',
+                           r'валдберрис', r'avito', r'пят(ё|е)рочка', r'ашан',
+                           r'д(и|и)?кси', r'лента', r'okey', r'окей', r'\bip\b',
+                            r'ярче!?', r'yarche',
+                           r'GLOBUS',
+                            r'мария[\s\-]?ра', r'maria[\s\-]?ra',
+                            r'монетка', r'monetka',
+                            r'командор', r'komandor',
+                            r'холидей', r'holiday',
+                            r'батон', r'baton',
+                            r'аникс', r'aniks',
+                            r'слата', r'slata',
+                            r'ярмарка',
+                            r'континент', r'kontinent',
+                            r'пч[её]лка', r'pchelk',
+                            r'dns[-\s]?shop', r'\bdns\b',
+                            r'citilink', r'ситилинк',
+                            r'leroy[\s\-]?merlin', r'леруа',
+                            r'\bobi\b', r'оби',
+                            r'trial', r'sport'],
+
+    'Транспорт':          ['metro', 'omka', 'омка', 'Transport'],
+    'Доставка':       [r'yandex', r'яндекс', r'eda', r'еда', r'samokat', r'самокат',
+                           r'delivery', r'доставка', r'uber', r'ubereats', r'food',
+                           r'доставк[ae]', r'деливери'],
+    'Развлечения':        [r'ivi', r'okko', r'kinopoisk', r'netflix', r'кинопоиск'],
+    'Пополнение':         [r'пополнение', r'внесение наличных', r'cashback', r'кэшбэк'],
+    'ЖКХ':     [r'zhku', r'жкх', r'kvartplata', r'квартплата', r'dsos', r'коммунал'],
+    'Переводы':           [r'перевод'],
+}
+
+TBANK_CATEGORIZER = Categorizer(TBANK_CATEGORIES.items())
 
 def categorize_tbank(txs):
-    rules = {
-        'Кофейни':            [r'кофе', r'кофейня', r'кофешоп', r'cafe', r'coffee',
-                               r'шоколадница', r'кофемания', r'Coffeemania',
-                               r'даблби', r'DBL', r'DoubleB', r'скуратов', r'skuratov',
-                               r'энитайм', r'entime', r'starbucks', r'старбакс'],
-        'Магазины':           [r'krasnoe', r'красное', r'beloye', r'белое', r'magnit', r'магнит',
-                               r'победа', r'pobeda', r'plaza', r'fixprice', r'фикс прайс',
-                               r'triumf', r'триумф', r'bufet', r'буфет', r'pek', r'пекарушка',
-                               r'prostor', r'простор', r'ozon', r'ozon\.ru', r'wildberries',
-                               r'валдберрис', r'avito', r'пят(ё|е)рочка', r'ашан',
-                               r'д(и|и)?кси', r'лента', r'okey', r'окей', r'\bip\b',
-                                r'ярче!?', r'yarche',
-                               r'GLOBUS'
-                                r'мария[\s\-]?ра', r'maria[\s\-]?ra',
-                                r'монетка', r'monetka',
-                                r'командор', r'komandor',
-                                r'холидей', r'holiday',
-                                r'батон', r'baton',
-                                r'аникс', r'aniks',
-                                r'слата', r'slata',
-                                r'ярмарка',
-                                r'континент', r'kontinent',
-                                r'пч[её]лка', r'pchelk',
-                                r'dns[-\s]?shop', r'\bdns\b',
-                                r'citilink', r'ситилинк',
-                                r'leroy[\s\-]?merlin', r'леруа',
-                                r'\bobi\b', r'оби',
-                                r'trial', r'sport'],
-
-        'Транспорт':          ['metro', 'omka', 'омка', 'Transport'],
-        'Доставка':       [r'yandex', r'яндекс', r'eda', r'еда', r'samokat', r'самокат',
-                               r'delivery', r'доставка', r'uber', r'ubereats', r'food',
-                               r'доставк[ae]', r'деливери'],
-        'Развлечения':        [r'ivi', r'okko', r'kinopoisk', r'netflix', r'кинопоиск'],
-        'Пополнение':         [r'пополнение', r'внесение наличных', r'cashback', r'кэшбэк'],
-        'ЖКХ':     [r'zhku', r'жкх', r'kvartplata', r'квартплата', r'dsos', r'коммунал'],
-        'Переводы':           [r'перевод'],
-    }
-    regex = {cat: [re.compile(p, re.IGNORECASE) for p in pats] for cat, pats in rules.items()}
-    for tx in txs:
-        tx['category'] = 'Другие'
-        for cat, patterns in regex.items():
-            if any(p.search(tx['description']) for p in patterns):
-                tx['category'] = cat
-                break
-    return txs
+    return TBANK_CATEGORIZER.categorize(txs)
 
 # --- ПАРСЕР СБЕРБАНКА ---
-def parse_sber_statement(pdf_path):
-    with pdfplumber.open(pdf_path) as pdf:
-        texts = [page.extract_text() for page in pdf.pages if page.extract_text()]
-        full_text = "\n".join(texts)
-        lowered_full = full_text.lower()
-        first_page = texts[0].lower() if texts else ""
-
-    if any(foreign in first_page for foreign in ["тинькофф", "tinkoff", "т-банк", "t-bank"]):
-        raise ValueError("❌ Это не выписка Сбербанка (обнаружен другой банк в заголовке)")
-
-    sber_ok = any(p in first_page for p in [
-        "сбербанк", "выписка по счету", "дебетовая карта", "итого по операциям"
-    ])
-    if not sber_ok:
-        raise ValueError("❌ Это не выписка Сбербанка (не найдено характерных признаков)")
+SBER_PERIOD = re.compile(r'Итого по операциям с (\d{2}\.\d{2}\.\d{4}) по (\d{2}\.\d{2}\.\d{4})')
+SBER_PERIOD_FALLBACK = TBANK_PERIOD
+SBER_DATE_PREFIX = re.compile(r"\d{2}\.\d{2}\.\d{4}")
+SBER_LINE = re.compile(r"(\d{2}\.\d{2}\.\d{4})\s+\d{2}:\d{2}\s+\d+\s+(.*?)\s+([+\-]?\d[\d\s\xa0]*,\d{2})")
 
+class SberStatementParser(StatementParser):
+    bank = "sber"
 
-    m = re.search(r'Итого по операциям с (\d{2}\.\d{2}\.\d{4}) по (\d{2}\.\d{2}\.\d{4})', full_text)
-    if not m:
-        m = re.search(r'Движение средств за период с (\d{2}\.\d{2}\.\d{4}) по (\d{2}\.\d{2}\.\d{4})', full_text)
-    start, end = m.groups() if m else (None, None)
+    def watch_period(self, pages):
+        # «Итого по операциям» приоритетнее «Движения средств», где бы они ни встретились,
+        # поэтому период по запасному шаблону окончательный только в конце документа
+        for page in pages:
+            if not self.period_final:
+                m = SBER_PERIOD.search(page)
+                if m:
+                    self.start, self.end = m.groups()
+                    self.period_final = True
+                elif self.start is None:
+                    m = SBER_PERIOD_FALLBACK.search(page)
+                    if m:
+                        self.start, self.end = m.groups()
+            yield page
+        self.period_final = True
 
-    lines = full_text.split('\n')
-    operation_lines = [line.strip() for line in lines if re.match(r"\d{2}\.\d{2}\.\d{4}", line.strip())]
+    def records(self, lines):
+        for line in lines:
+            if not SBER_DATE_PREFIX.match(line):
+                continue
+            match = SBER_LINE.match(line)
+            if not match:
+                continue
 
-    transactions = []
-    for line in operation_lines:
-        match = re.match(r"(\d{2}\.\d{2}\.\d{4})\s+\d{2}:\d{2}\s+\d+\s+(.*?)\s+([+\-]?\d[\d\s\xa0]*,\d{2})", line)
-        if match:
             date, description, raw_amount = match.groups()
             clean_str = raw_amount.replace("\xa0", "").replace(" ", "").replace(",", ".")
             amount_value = float(clean_str.lstrip("+-"))
@@ -146,53 +255,154 @@ def parse_sber_statement(pdf_path):
             is_income = raw_amount.strip().startswith("+")
             signed_amount = amount_value if is_income else -amount_value
 
-            transactions.append({
+            yield {
                 "date": datetime.datetime.strptime(date, "%d.%m.%Y").date().isoformat(),
                 "time": None,
                 "amount": signed_amount,
                 "description": description.strip(),
                 "isIncome": is_income
-            })
-    return start, end, categorize_sber(transactions)
+            }
 
+    def transactions(self, pages):
+        lines = iter_lines(self.watch_period(pages), split=lambda page: page.split('\n'))
+        return categorize_stream(self.records(lines), sber_category)
+
+def parse_sber_statement(pdf_path):
+    return parse_sber_pages(extract_statement_pages(pdf_path, "sber")[1])
+
+def parse_sber_pages(pages):
+    return SberStatementParser().parse(pages)
 
-def categorize_sber(txs):
-    mapping = {
-        "внесение наличных": "Пополнение",
-        "прочие операции": "Переводы",
-        "перевод на карту": "Переводы",
-        "перевод физическому лицу": "Переводы",
-        "перевод СБП": "Переводы",
-        "оплата по реквизитам": "Переводы",
-        "перевод с карты": "Переводы",
-        "отдых и развлечения": "Развлечения",
-        "транспорт": "Транспорт",
-        "магазин": "Магазины",
-        "кафе": "Кофейни",
-        "ресторан": "Кофейни",
-        "кофейня": "Кофейни",
-        "доставка": "Доставка",
-        "яндекс еда": "Доставка",
-        "delivery": "Доставка",
-        "жку": "ЖКХ",
-    }
-
-    def remap(description: str) -> str:
-        desc = description.lower()
-        for key in mapping:
-            if key in desc:
-                return mapping[key]
-        return "Другие"
 
+SBER_CATEGORIES = {
+    "внесение наличных": "Пополнение",
+    "прочие операции": "Переводы",
+    "перевод на карту": "Переводы",
+    "перевод физическому лицу": "Переводы",
+    "перевод сбп": "Переводы",
+    "оплата по реквизитам": "Переводы",
+    "перевод с карты": "Переводы",
+    "отдых и развлечения": "Развлечения",
+    "транспорт": "Транспорт",
+    "магазин": "Магазины",
+    "кафе": "Кофейни",
+    "ресторан": "Кофейни",
+    "кофейня": "Кофейни",
+    "доставка": "Доставка",
+    "яндекс еда": "Доставка",
+    "delivery": "Доставка",
+    "жку": "ЖКХ",
+}
+
+def sber_category(description: str) -> str:
+    # Ключи — короткие подстроки: проверки `in` по порядку словаря быстрее любой общей регулярки
+    desc = description.lower()
+    for key, category in SBER_CATEGORIES.items():
+        if key in desc:
+            return category
+    return "Другие"
+
+def categorize_sber(txs):
     for tx in txs:
-        tx['category'] = remap(tx['description'])
+        tx['category'] = sber_category(tx['description'])
     return txs
 
-def parse_statement(pdf_path, bank: str):
-    bank = bank.lower()
-    if bank in ("tinkoff", "tbank"):
-        return parse_tbank_statement(pdf_path)
-    elif bank == "sber":
-        return parse_sber_statement(pdf_path)
-    else:
+# --- ОПРЕДЕЛЕНИЕ БАНКА И ИЗВЛЕЧЕНИЕ ТЕКСТА ---
+TBANK_MARKERS = re.compile(r'т-?банк|тинькофф|tinkoff|t-bank', re.IGNORECASE)
+SBER_MARKERS = ["сбербанк", "выписка по счету", "дебетовая карта", "итого по операциям"]
+
+BANK_NAMES = {"tinkoff": "tbank", "tbank": "tbank", "sber": "sber"}
+
+def detect_bank(first_page: str):
+    """Банк по тексту первой страницы: 'tbank', 'sber' или None."""
+    if TBANK_MARKERS.search(first_page):
+        return "tbank"
+    lowered = first_page.lower()
+    if any(p in lowered for p in SBER_MARKERS):
+        return "sber"
+    return None
+
+def resolve_bank(first_page: str, bank: str | None = None) -> str:
+    detected = detect_bank(first_page)
+
+    if bank is None:
+        if detected is None:
+            raise ValueError("❌ Не удалось определить банк выписки")
+        return detected
+
+    expected = BANK_NAMES.get(bank.lower())
+    if expected is None:
         raise ValueError(f"❌ Unsupported bank: {bank}")
+    if detected != expected:
+        if expected == "tbank":
+            raise ValueError("❌ Файл не является выпиской Т-банка")
+        if detected == "tbank":
+            raise ValueError("❌ Это не выписка Сбербанка (обнаружен другой банк в заголовке)")
+        raise ValueError("❌ Это не выписка Сбербанка (не найдено характерных признаков)")
+    return expected
+
+def _page_text(page) -> str:
+    text = page.extract_text() or ""
+    page.close()  # сбрасываем кэш объектов страницы, он нужен только для extract_text
+    return text
+
+def open_pdf(source):
+    return pdfplumber.open(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+
+def probe_statement(source, bank: str | None = None, max_pages: int | None = None):
+    """
+    Открывает PDF, определяет (или проверяет) банк по первой странице до разбора остальных,
+    так что неверный банк отсекается сразу. Извлекает текст первых max_pages страниц (всех, если None).
+    Возвращает (банк, тексты извлечённых страниц, всего страниц).
+    """
+    with open_pdf(source) as pdf:
+        if not pdf.pages:
+            raise ValueError("❌ PDF не содержит страниц")
+
+        page_count = len(pdf.pages)
+        first_page = _page_text(pdf.pages[0])
+        bank = resolve_bank(first_page, bank)
+        stop = page_count if max_pages is None else min(page_count, max_pages)
+        texts = [first_page] + [_page_text(page) for page in pdf.pages[1:stop]]
+
+    return bank, texts, page_count
+
+def extract_page_range(source, start: int, stop: int) -> list[str]:
+    """Текст страниц [start, stop). Единица работы для параллельного извлечения."""
+    with open_pdf(source) as pdf:
+        return [_page_text(page) for page in pdf.pages[start:stop]]
+
+def split_page_ranges(start: int, stop: int, size: int) -> list[tuple[int, int]]:
+    """Делит страницы [start, stop) на куски по size страниц."""
+    return [(i, min(i + size, stop)) for i in range(start, stop, size)]
+
+def extract_statement_pages(source, bank: str | None = None):
+    """Извлекает текст каждой страницы ровно один раз. Возвращает (банк, тексты страниц)."""
+    bank, texts, _ = probe_statement(source, bank)
+    return bank, texts
+
+PARSERS = {
+    "tbank": TBankStatementParser,
+    "sber": SberStatementParser,
+}
+
+def parse_pages(bank: str, pages):
+    return PARSERS[bank]().parse(pages)
+
+def parse_statement(pdf_path, bank: str | None = None):
+    bank, pages = extract_statement_pages(pdf_path, bank)
+    return parse_pages(bank, pages)
+
+
+def traced(fn, *args):
+    """Выполняет fn(*args); при PARSE_TRACE_MEMORY ещё и замеряет пик памяти. Возвращает (результат, пик или None)."""
+    if not PARSE_TRACE_MEMORY:
+        return fn(*args), None
+
+    tracemalloc.start()
+    try:
+        result = fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak